@@ -1,17 +1,33 @@
 # auth.py
 import requests
+from requests.adapters import HTTPAdapter
 import json
 from config import load_config
+from ratelimit import RequestScheduler, ThrottledSession
 
-def load_cookies():
-    config = load_config()
+def load_cookies(config=None):
+    config = config or load_config()
     with open(config["COOKIES_FILE"], "r") as f:
         cookies_json = json.load(f)
     if isinstance(cookies_json, dict):
         return cookies_json
     return {cookie["name"]: cookie["value"] for cookie in cookies_json}
 
-def create_session():
-    session = requests.Session()
-    session.cookies.update(load_cookies())
+def create_adapter(pool_size):
+    return HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+
+def create_session(scheduler=None, config=None, adapter=None):
+    """Create a cookie-authenticated session paced by a RequestScheduler.
+
+    Pass `scheduler` to share pacing state between several sessions, and
+    `adapter` to share their connection pools.
+    """
+    config = config or load_config()
+    session = ThrottledSession(scheduler or RequestScheduler.from_config(config))
+    session.cookies.update(load_cookies(config))
+    # Size the connection pool so concurrent workers don't discard connections
+    pool_size = max(10, int(config.get("INDEX_WORKERS", 1)), int(config.get("DOWNLOAD_WORKERS", 4)))
+    adapter = adapter or create_adapter(pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
     return session
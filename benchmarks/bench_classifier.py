@@ -0,0 +1,155 @@
+# benchmarks/bench_classifier.py
+"""Micro-benchmark for link classification.
+
+Compares the previous per-call implementation of is_downloadable_file /
+get_filename_from_url_or_text against link_classifier.classify_link over a
+corpus of Canvas-style links, checks that both agree, and prints calls/sec.
+
+    python benchmarks/bench_classifier.py [--repeat N]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from link_classifier import classify_link, link_filename
+
+BASE = "https://school.instructure.com"
+
+# Anchors as they appear on Canvas file, wiki and module pages
+LINK_TEMPLATES = [
+    ("{base}/courses/{c}/files/{f}/download?download_frd=1", "Download Lecture {f}.pdf"),
+    ("{base}/courses/{c}/files/{f}?wrap=1", "Week {f} slides"),
+    ("{base}/courses/{c}/files/{f}/preview", "Syllabus"),
+    ("{base}/courses/{c}/modules/items/{f}", "Module overview"),
+    ("{base}/courses/{c}/pages/week-{f}-reading", "Week {f} reading page"),
+    ("{base}/courses/{c}/assignments/{f}", "Assignment {f}"),
+    ("{base}/courses/{c}/discussion_topics/{f}", "Discussion: week {f}"),
+    ("{base}/courses/{c}/quizzes/{f}", "Quiz {f}"),
+    ("{base}/courses/{c}/grades", "Grades"),
+    ("{base}/users/{u}/files/{f}/download?verifier=abc{f}", "photo.png"),
+    ("{base}/courses/{c}/file_contents/course%20files/handout{f}.docx", "Handout"),
+    ("https://www.youtube.com/watch?v=abc{f}", "Lecture recording"),
+    ("https://en.wikipedia.org/wiki/Topic_{f}", "Wikipedia page"),
+    ("https://docs.google.com/document/d/{f}/edit", "Shared notes"),
+    ("https://example.edu/~prof/notes/chapter{f}.PDF", "Chapter {f}"),
+    ("https://example.edu/data/set{f}.csv#section", "Dataset"),
+    ("https://example.edu/code/lab{f}.tar.gz", "Lab code"),
+    ("https://example.edu/lab{f}/", "Lab instructions"),
+    ("mailto:prof{f}@school.edu", "Email the professor"),
+    ("{base}/courses/{c}/external_tools/{f}", "Open tool"),
+]
+
+def reference_is_downloadable_file(url, text):
+    """The classifier as it was before link_classifier, kept verbatim for comparison."""
+    downloadable_extensions = {
+        '.pdf', '.doc', '.docx', '.ppt', '.pptx', '.xls', '.xlsx',
+        '.zip', '.rar', '.7z', '.tar', '.gz',
+        '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg',
+        '.mp3', '.mp4', '.avi', '.mov', '.wav',
+        '.txt', '.csv', '.json', '.xml', '.html', '.css', '.js',
+        '.py', '.java', '.cpp', '.c', '.h',
+        '.sql', '.db', '.sqlite', '.rtf', '.odt', '.ods', '.odp'
+    }
+    url_lower = url.lower()
+    for ext in downloadable_extensions:
+        if url_lower.endswith(ext) or f'{ext}?' in url_lower or f'{ext}#' in url_lower:
+            return True
+    canvas_file_patterns = [
+        r'/courses/\d+/files/\d+',
+        r'/files/\d+',
+        r'/download\?download_frd=1',
+        r'/courses/\d+/file_contents/',
+        r'/users/\d+/files/\d+',
+        r'instructure\.com.*files',
+    ]
+    for pattern in canvas_file_patterns:
+        if re.search(pattern, url):
+            return True
+    file_indicators = ['download', 'attachment', 'file', '.pdf', '.doc', '.ppt', '.xls',
+                      'handout', 'worksheet', 'assignment', 'syllabus', 'slides']
+    text_lower = text.lower()
+    for indicator in file_indicators:
+        if indicator in text_lower:
+            return True
+    non_file_indicators = ['http://www.', 'https://www.', 'wiki', 'page', 'module',
+                          'discussion', 'assignment submission', 'grade', 'course']
+    for indicator in non_file_indicators:
+        if indicator in text_lower and not any(ext in url_lower for ext in downloadable_extensions):
+            return False
+    return False
+
+def reference_get_filename(url, text):
+    if '?' in url:
+        url_path = url.split('?')[0]
+    else:
+        url_path = url
+    filename = os.path.basename(url_path)
+    if not filename or filename.isdigit() or not '.' in filename:
+        filename = text.strip()
+        if filename.lower().startswith("download "):
+            filename = filename[9:]
+        if not '.' in filename and '.' in url_path:
+            url_parts = url_path.split('.')
+            if len(url_parts) > 1:
+                ext = '.' + url_parts[-1]
+                if len(ext) <= 5:
+                    filename += ext
+    filename = re.sub(r'[\\/*?:"<>|]', "", filename)
+    return filename if filename else "downloaded_file"
+
+def reference_classify(url, text):
+    if reference_is_downloadable_file(url, text):
+        return True, reference_get_filename(url, text)
+    return False, None
+
+def build_corpus(courses=6, files_per_course=40):
+    """Links for several courses; each course page repeats its own links a few times, as Canvas pages do."""
+    corpus = []
+    for c in range(1, courses + 1):
+        course_links = [
+            (url.format(base=BASE, c=1000 + c, u=50 + c, f=f), text.format(f=f))
+            for f in range(files_per_course)
+            for url, text in LINK_TEMPLATES
+        ]
+        corpus.extend(course_links * 3)
+    return corpus
+
+def bench(name, fn, corpus, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for url, text in corpus:
+            fn(url, text)
+    elapsed = time.perf_counter() - start
+    calls = len(corpus) * repeat
+    print(f"{name:<28} {calls / elapsed:>12,.0f} links/s  ({elapsed:.3f}s for {calls:,} links)")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    mismatches = [(u, t) for u, t in set(corpus) if reference_classify(u, t) != classify_link(u, t)]
+    if mismatches:
+        for url, text in mismatches[:10]:
+            print(f"MISMATCH {url!r} {text!r}: {reference_classify(url, text)} != {classify_link(url, text)}")
+        sys.exit(1)
+    print(f"{len(set(corpus)):,} distinct links, {len(corpus):,} per pass, classifications identical\n")
+
+    before = bench("reference", reference_classify, corpus, args.repeat)
+    def uncached(url, text):
+        classify_link.cache_clear()
+        link_filename.cache_clear()
+        return classify_link(url, text)
+
+    cold = bench("classify_link (no memo)", uncached, corpus, 1)
+    classify_link.cache_clear()
+    after = bench("classify_link (memoized)", classify_link, corpus, args.repeat)
+    print(f"\nspeedup: {before / after:.1f}x memoized, {before / args.repeat / cold:.1f}x without memo hits")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# benchmarks/bench_download.py
+"""Throughput and CPU cost of streaming one large file to disk.
+
+Serves a file of --size MB from `python -m http.server` in a separate
+process, so only the client's CPU time is measured, and downloads it with
+the 8 KB iter_content() loop the downloader used to have ("before") and with
+downloader.download_file ("after"). Both report progress through a locked
+callback the way DownloadManager does.
+
+    python benchmarks/bench_download.py --size 512 --repeat 3
+    python benchmarks/bench_download.py --set DOWNLOAD_CHUNK_SIZE=1048576
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import requests
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(directory):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "http.server", str(port), "--bind", "127.0.0.1",
+                               "--directory", directory], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return server, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("http.server did not start")
+
+def make_progress():
+    lock = threading.Lock()
+    done = [0]
+    def progress(n):
+        with lock:
+            done[0] += n
+    return progress, done
+
+def download_before(session, url, path):
+    """The previous write path: 8 KB chunks, one write and one progress call each."""
+    progress, done = make_progress()
+    with session.get(url, stream=True, timeout=15) as r, open(path + ".part", "wb") as f:
+        r.raise_for_status()
+        for chunk in r.iter_content(chunk_size=8192):
+            f.write(chunk)
+            progress(len(chunk))
+    os.replace(path + ".part", path)
+    return done[0]
+
+def download_after(session, url, path):
+    from downloader import download_file
+    from manifest import Manifest
+    progress, done = make_progress()
+    # A fresh manifest each run, since measure() deletes the previous download behind its back
+    manifest = Manifest(os.path.dirname(path)).scan()
+    download_file(session, url, path, {}, progress=progress, manifest=manifest)
+    return done[0]
+
+def measure(fn, session, url, path):
+    if os.path.exists(path):
+        os.remove(path)
+    wall, cpu = time.perf_counter(), time.process_time()
+    nbytes = fn(session, url, path)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    if nbytes != os.path.getsize(path):
+        raise RuntimeError(f"{fn.__name__} reported {nbytes} bytes, wrote {os.path.getsize(path)}")
+    return nbytes / wall / 1024 / 1024, 100 * cpu / wall
+
+def parse_override(text):
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--size", type=int, default=256, help="file size in MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--set", dest="overrides", action="append", type=parse_override, default=[],
+                        metavar="KEY=VALUE", help="override a config.json key (value parsed as JSON)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="canvas-download-")
+    cwd = os.getcwd()
+    server = None
+    try:
+        serve_dir = os.path.join(workdir, "serve")
+        download_dir = os.path.join(workdir, "CanvasDownloads")
+        os.makedirs(serve_dir)
+        os.makedirs(download_dir)
+        with open(os.path.join(serve_dir, "video.mp4"), "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size):
+                f.write(block)
+
+        with open(os.path.join(REPO_DIR, "config.json")) as f:
+            config = json.load(f)
+        config.update({"DOWNLOAD_DIR": download_dir, "SCRIPT_LOG_FILE": os.path.join(workdir, "script.log")})
+        config.update(dict(args.overrides))
+        with open(os.path.join(workdir, "config.json"), "w") as f:
+            json.dump(config, f, indent=4)
+        os.chdir(workdir)
+
+        server, base_url = start_server(serve_dir)
+        session = requests.Session()
+        url = f"{base_url}/video.mp4"
+        path = os.path.join(download_dir, "video.mp4")
+        print(f"Downloading {args.size} MB from a local server, best of {args.repeat}:")
+        results = {}
+        for name, fn in (("before", download_before), ("after", download_after)):
+            runs = [measure(fn, session, url, path) for _ in range(args.repeat)]
+            best = max(runs)
+            results[name] = best
+            print(f"  {name:<6} {best[0]:8.1f} MB/s  {best[1]:5.1f}% CPU  (median {statistics.median(r[0] for r in runs):.1f} MB/s)")
+        before, after = results["before"], results["after"]
+        print(f"  CPU seconds per GB: {before[1] / before[0] * 10.24:.2f} -> {after[1] / after[0] * 10.24:.2f}")
+    finally:
+        os.chdir(cwd)
+        if server:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
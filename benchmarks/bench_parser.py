@@ -0,0 +1,174 @@
+# benchmarks/bench_parser.py
+"""Parity check and micro-benchmark for the scraper's HTML parsing.
+
+Parses the saved Canvas pages in benchmarks/fixtures with the scraper as it
+was before html_parser (a full BeautifulSoup(html, "html.parser") tree per
+page, kept verbatim below) and with the current scraper, which builds only
+the strained subtrees, under each available backend. Exits non-zero if any
+result differs, then prints pages/sec for both.
+
+    python benchmarks/bench_parser.py [--repeat N] [--backend html.parser|lxml]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import importlib.util
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+sys.path.insert(0, REPO_DIR)
+
+from bs4 import BeautifulSoup
+import html_parser
+import scraper
+from link_classifier import classify_link
+
+BASE = "https://school.instructure.com"
+
+def reference_parse_courses(html):
+    soup = BeautifulSoup(html, "html.parser")
+    courses = []
+    for row in soup.select('tr.course-list-table-row'):
+        name_el = row.select_one('.course-list-course-title-column .name')
+        id_el = row.select_one('.course-list-star-column [data-course-id]')
+        if name_el and id_el:
+            course_name = name_el.text.strip()
+            course_id = id_el['data-course-id']
+            courses.append({'name': course_name, 'id': course_id})
+    return courses
+
+def reference_parse_modules_and_items(html, course_id, base_url):
+    soup = BeautifulSoup(html, "html.parser")
+    modules = []
+    for module_div in soup.select("div.item-group-condensed.context_module"):
+        module_name_el = module_div.select_one("span.name")
+        module_name = module_name_el.text.strip() if module_name_el else "UnknownModule"
+        module_name = re.sub(r'[\\/*?:"<>|]', "", module_name)
+        items = []
+        for li in module_div.select("li.context_module_item"):
+            link = li.select_one("a.item_link")
+            if not link: continue
+            item_title = link.text.strip()
+            item_href = link.get("href")
+            item_url = base_url + item_href
+            items.append({'title': item_title, 'url': item_url})
+        modules.append({'name': module_name, 'items': items})
+    return modules
+
+def reference_parse_file_download_link(file_page_html, base_url):
+    soup = BeautifulSoup(file_page_html, "html.parser")
+    a = soup.find('a', attrs={'download': 'true'})
+    if a and '/download?download_frd=1' in a['href']:
+        file_url = a['href']
+        file_name = a.text.strip()
+        if file_url.startswith("/"):
+            file_url = base_url + file_url
+        if file_name.lower().startswith("download "):
+            file_name = file_name[8:]
+        file_name = file_name.strip()
+        return file_name, file_url
+    for a in soup.find_all('a', href=True):
+        href = a['href']
+        text = a.text.strip()
+        if not href or href.startswith('#') or href.startswith('mailto:'):
+            continue
+        if href.startswith("/"):
+            full_url = base_url + href
+        else:
+            full_url = href
+        downloadable, filename = classify_link(full_url, text)
+        if downloadable:
+            return filename, full_url
+    return None, None
+
+def reference_parse_wiki_page_links(body_html, base_url):
+    """The link scan of the old page parser, over the body it extracted."""
+    soup = BeautifulSoup(body_html, "html.parser")
+    links = []
+    for a in soup.find_all('a', href=True):
+        href = a['href']
+        text = a.text.strip()
+        if not href or href.startswith('mailto:') or href.startswith('#'):
+            continue
+        full_url = base_url + href if href.startswith("/") else href
+        downloadable, filename = classify_link(full_url, text)
+        if downloadable and full_url not in [url for _, url in links]:
+            links.append((filename, full_url))
+    return links
+
+def wiki_body(page_html):
+    return scraper.parse_wiki_page(page_html)[1]
+
+# fixture -> (reference, current), each taking the page's HTML
+CASES = {
+    "courses.html": (reference_parse_courses, scraper.parse_courses),
+    "modules.html": (lambda html: reference_parse_modules_and_items(html, "4711", BASE),
+                     lambda html: scraper.parse_modules_and_items(html, "4711", BASE)),
+    "file_page.html": (lambda html: reference_parse_file_download_link(html, BASE),
+                       lambda html: scraper.parse_file_download_link(html, BASE)),
+    "file_page_fallback.html": (lambda html: reference_parse_file_download_link(html, BASE),
+                                lambda html: scraper.parse_file_download_link(html, BASE)),
+    "wiki_page.html": (lambda html: reference_parse_wiki_page_links(wiki_body(html), BASE),
+                       lambda html: scraper.parse_wiki_page_links(wiki_body(html), BASE)),
+}
+
+def load_fixtures():
+    fixtures = {}
+    for name in CASES:
+        with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+            fixtures[name] = f.read()
+    return fixtures
+
+def use_backend(name):
+    # HTML_PARSER is resolved once per process; switch it directly instead of through config.json
+    html_parser._parser_name = name
+
+def check_parity(fixtures, backend):
+    use_backend(backend)
+    mismatches = 0
+    for name, html in fixtures.items():
+        reference, current = CASES[name]
+        expected, actual = reference(html), current(html)
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH {name} ({backend}):\n  reference: {expected!r}\n  current:   {actual!r}")
+        elif not expected or expected == (None, None):
+            mismatches += 1
+            print(f"EMPTY {name}: the fixture no longer exercises its parser")
+    return mismatches
+
+def bench(label, fn, fixtures, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for name, html in fixtures.items():
+            fn(name, html)
+    elapsed = time.perf_counter() - start
+    pages = len(fixtures) * repeat
+    print(f"{label:<28} {pages / elapsed:>10,.0f} pages/s  ({elapsed:.3f}s for {pages:,} pages)")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--backend", action="append", choices=["html.parser", "lxml"],
+                        help="backend to check (default: every installed one)")
+    args = parser.parse_args()
+
+    backends = args.backend or ["html.parser"] + (["lxml"] if importlib.util.find_spec("lxml") else [])
+    fixtures = load_fixtures()
+    mismatches = sum(check_parity(fixtures, backend) for backend in backends)
+    if mismatches:
+        sys.exit(1)
+    print(f"{len(fixtures)} fixture pages, results identical with {', '.join(backends)}\n")
+
+    before = bench("reference (full html.parser)", lambda name, html: CASES[name][0](html), fixtures, args.repeat)
+    for backend in backends:
+        use_backend(backend)
+        after = bench(f"make_soup ({backend})", lambda name, html: CASES[name][1](html), fixtures, args.repeat)
+        print(f"  speedup: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# benchmarks/bench_startup.py
+"""Startup time of a no-op run: the index is current and every file is already downloaded.
+
+Builds a temporary work directory with config.json (static mode, no
+re-index, no re-download), an index of N files and the files themselves,
+then times `python main.py` end to end in a fresh interpreter each time.
+
+    python benchmarks/bench_startup.py --courses 10 --modules 10 --items 20 --repeat 5
+    python benchmarks/bench_startup.py --imports       # also list the slowest imports
+    python benchmarks/bench_startup.py --set INDEX_STORE='"sqlite"'
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from generate import generate_site
+
+def build_workdir(workdir, site, overrides):
+    with open(os.path.join(REPO_DIR, "config.json")) as f:
+        config = json.load(f)
+    config.update({
+        "BASE_URL": "http://127.0.0.1:9",  # never contacted on a no-op run
+        "static_settings": True,
+        "always_reindex": False,
+        "always_redownload": False,
+    })
+    config.update(overrides)
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+    with open(os.path.join(workdir, config["COOKIES_FILE"]), "w") as f:
+        json.dump({}, f)
+
+    data = {"courses": [], "download_log": {}}
+    for course in site["courses"]:
+        course_data = {"name": course["name"], "id": str(course["id"]), "modules": []}
+        for module in course["modules"]:
+            files = []
+            for item in module["items"]:
+                for file_id in [item.get("file_id")] + item.get("file_ids", []):
+                    if not file_id:
+                        continue
+                    file = site["files"][file_id]
+                    path = os.path.join(config["DOWNLOAD_DIR"], course["name"], module["name"], file["name"])
+                    files.append({
+                        "name": file["name"],
+                        "url": f"{config['BASE_URL']}/courses/{course['id']}/files/{file_id}/download?download_frd=1",
+                        "size": file["size"],
+                        "downloaded": True,
+                        "path": path,
+                        "item_url": f"{config['BASE_URL']}/courses/{course['id']}/modules/items/{item['id']}",
+                    })
+                    full_path = os.path.join(workdir, path)
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    # Sparse files: only the size matters to a no-op run
+                    with open(full_path, "wb") as f:
+                        f.truncate(file["size"])
+            course_data["modules"].append({"name": module["name"], "items": [], "files": files})
+        course_data["total_modules"] = len(course_data["modules"])
+        course_data["total_files"] = sum(len(m["files"]) for m in course_data["modules"])
+        course_data["total_size"] = sum(f["size"] for m in course_data["modules"] for f in m["files"])
+        data["courses"].append(course_data)
+    data["total_courses"] = len(data["courses"])
+    data["total_files"] = sum(c["total_files"] for c in data["courses"])
+    data["total_size"] = sum(c["total_size"] for c in data["courses"])
+
+    data_file = os.path.join(workdir, config["DATA_FILE"])
+    os.makedirs(os.path.dirname(data_file), exist_ok=True)
+    with open(data_file, "w") as f:
+        json.dump(data, f, indent=2)
+    return data["total_files"]
+
+def time_run(workdir, extra_args=()):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *extra_args, os.path.join(REPO_DIR, "main.py")],
+                            cwd=workdir, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0 or "already downloaded" not in result.stdout:
+        raise RuntimeError(f"main.py did not take the no-op path:\n{result.stdout}\n{result.stderr}")
+    return elapsed, result.stderr
+
+def slowest_imports(importtime_output, top=15):
+    """(cumulative_us, self_us, module) for the slowest imports in `python -X importtime` output."""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative_us), int(self_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+def parse_override(text):
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--modules", type=int, default=10)
+    parser.add_argument("--items", type=int, default=20, help="items per module")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--imports", action="store_true", help="list the slowest imports (python -X importtime)")
+    parser.add_argument("--set", dest="overrides", action="append", type=parse_override, default=[],
+                        metavar="KEY=VALUE", help="override a config.json key (value parsed as JSON)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="canvas-startup-")
+    try:
+        site = generate_site(args.courses, args.modules, args.items, "small", 1.0, 3, 1)
+        files = build_workdir(workdir, site, dict(args.overrides))
+        time_run(workdir)  # warm the OS file cache and any first-run migrations
+        times = [time_run(workdir)[0] for _ in range(args.repeat)]
+        print(f"No-op run over {files} indexed files, {args.repeat} runs:")
+        print(f"  min {min(times)*1000:.0f} ms, median {statistics.median(times)*1000:.0f} ms, max {max(times)*1000:.0f} ms")
+        if args.imports:
+            _, stderr = time_run(workdir, ("-X", "importtime"))
+            print("\nSlowest imports (cumulative / self, ms):")
+            for cumulative, self_time, name in slowest_imports(stderr):
+                print(f"  {cumulative/1000:8.1f} {self_time/1000:8.1f}  {name}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# benchmarks/canvas_stub.py
+"""Local HTTP stand-in for the parts of Canvas the scraper, indexer and downloader use.
+
+Serves a site from generate.generate_site:
+
+    /courses                               course list table
+    /courses/:id/modules                   context_module markup
+    /courses/:id/modules/items/:id         302 to the file, wiki or assignment page
+    /courses/:id/files/:id                 file page with a download="true" anchor (ETag, 304)
+    /courses/:id/pages/:slug               wiki page (ENV.WIKI_PAGE body plus rendered links)
+    /courses/:id/assignments/:id           page without downloads
+    /courses/:id/files/:id/download        302 to /blobs/:id, like Canvas's redirect to its file store
+    /blobs/:id                             file body; HEAD, content-length and Range supported
+    /api/v1/courses/:id/modules            paginated modules with items (Link headers)
+    /api/v1/courses/:id/files              paginated file list
+
+Every request can be delayed by `latency` seconds, and a `throttle_rate`
+fraction of them answered with 429 and Retry-After.
+"""
+import re
+import json
+import time
+import random
+import threading
+import http.server
+from html import escape
+from urllib.parse import urlparse, parse_qs
+
+CHUNK = bytes(range(256)) * 256  # 64 KB pattern the file bodies are made of
+
+class CanvasStub:
+    def __init__(self, site, latency=0.0, throttle_rate=0.0, retry_after=1, host="127.0.0.1", port=0, seed=1):
+        self.site = site
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.bytes_sent = 0
+        self.courses = {str(c["id"]): c for c in site["courses"]}
+        self.items = {}
+        self.pages = {}
+        self.file_course = {}
+        for course in site["courses"]:
+            for module in course["modules"]:
+                for item in module["items"]:
+                    self.items[str(item["id"])] = (course, item)
+                    if item["type"] == "Page":
+                        self.pages[(str(course["id"]), item["slug"])] = item
+                    for file_id in [item.get("file_id")] + item.get("file_ids", []):
+                        if file_id:
+                            self.file_course[file_id] = course["id"]
+        self.server = http.server.ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + n
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts = {}
+            self.bytes_sent = 0
+
+    def total_requests(self):
+        with self.lock:
+            return sum(v for k, v in self.counts.items() if k in ("GET", "HEAD"))
+
+    # Page bodies
+
+    def courses_html(self):
+        rows = "".join(
+            f'<tr class="course-list-table-row">'
+            f'<td class="course-list-star-column"><span class="course-list-favorite-course" data-course-id="{c["id"]}"></span></td>'
+            f'<td class="course-list-course-title-column course-list-no-left-border">'
+            f'<a href="/courses/{c["id"]}"><span class="name">{escape(c["name"])}</span></a></td>'
+            f'<td class="course-list-term-column">Fall</td></tr>'
+            for c in self.site["courses"]
+        )
+        return f'<html><body><table id="my_courses_table"><tbody>{rows}</tbody></table></body></html>'
+
+    def modules_html(self, course):
+        parts = []
+        for module in course["modules"]:
+            items = "".join(
+                f'<li class="context_module_item {item["type"].lower()}" id="context_module_item_{item["id"]}">'
+                f'<div class="ig-row"><span class="item_name">'
+                f'<a class="ig-title title item_link" href="/courses/{course["id"]}/modules/items/{item["id"]}">'
+                f'{escape(item["title"])}</a></span></div></li>'
+                for item in module["items"]
+            )
+            parts.append(
+                f'<div class="item-group-condensed context_module" id="context_module_{module["id"]}">'
+                f'<div class="ig-header header"><span class="name" title="{escape(module["name"])}">{escape(module["name"])}</span></div>'
+                f'<ul class="ig-list items context_module_items">{items}</ul></div>'
+            )
+        return f'<html><body><div id="context_modules">{"".join(parts)}</div></body></html>'
+
+    def file_html(self, course_id, file_id):
+        name = escape(self.site["files"][file_id]["name"])
+        return (f'<html><body><div id="content"><h2>{name}</h2>'
+                f'<a href="/courses/{course_id}/files/{file_id}/download?download_frd=1" download="true">Download {name}</a>'
+                f'</div></body></html>')
+
+    def page_html(self, course_id, item):
+        links = "".join(
+            f'<li><a href="/courses/{course_id}/files/{fid}/download?download_frd=1">{escape(self.site["files"][fid]["name"])}</a></li>'
+            for fid in item["file_ids"]
+        )
+        body = f'<p>Readings for {escape(item["title"])} – café notes</p><ul>{links}</ul>'
+        env = json.dumps({"WIKI_PAGE": {"title": item["title"], "body": body}})
+        return (f'<html><head><script>ENV = {env};</script></head><body>'
+                f'<div class="show-content user_content">{body}</div></body></html>')
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body=b"", content_type="text/html; charset=utf-8", headers=None):
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if self.command != "HEAD" and body:
+                    self.wfile.write(body)
+                    stub.count("bytes", len(body))
+
+            def redirect(self, location):
+                self.send(302, headers={"Location": location})
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_GET(self):
+                stub.count(self.command)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub.throttle_rate:
+                    with stub.lock:
+                        throttled = stub.rng.random() < stub.throttle_rate
+                    if throttled:
+                        stub.count("throttled")
+                        return self.send(429, "Rate Limit Exceeded", "text/plain", {"Retry-After": str(stub.retry_after)})
+                try:
+                    self.route(urlparse(self.path))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def route(self, url):
+                path = url.path
+                if path == "/courses":
+                    return self.send(200, stub.courses_html())
+
+                m = re.fullmatch(r"/courses/(\d+)/modules", path)
+                if m and m[1] in stub.courses:
+                    return self.send(200, stub.modules_html(stub.courses[m[1]]))
+
+                m = re.fullmatch(r"/courses/(\d+)/modules/items/(\d+)", path)
+                if m and m[2] in stub.items:
+                    course, item = stub.items[m[2]]
+                    if item["type"] == "File":
+                        return self.redirect(f"/courses/{course['id']}/files/{item['file_id']}")
+                    if item["type"] == "Page":
+                        return self.redirect(f"/courses/{course['id']}/pages/{item['slug']}")
+                    return self.redirect(f"/courses/{course['id']}/assignments/{item['id']}")
+
+                m = re.fullmatch(r"/courses/(\d+)/files/(\d+)", path)
+                if m and int(m[2]) in stub.site["files"]:
+                    etag = f'"file-{m[2]}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        return self.send(304, headers={"ETag": etag})
+                    return self.send(200, stub.file_html(m[1], int(m[2])), headers={"ETag": etag})
+
+                m = re.fullmatch(r"/courses/(\d+)/pages/([\w-]+)", path)
+                if m and (m[1], m[2]) in stub.pages:
+                    return self.send(200, stub.page_html(m[1], stub.pages[(m[1], m[2])]))
+
+                m = re.fullmatch(r"/courses/(\d+)/assignments/(\d+)", path)
+                if m:
+                    return self.send(200, f'<html><body><h1>Assignment {m[2]}</h1>'
+                                          f'<a href="/courses/{m[1]}/grades">Grades</a></body></html>')
+
+                m = re.fullmatch(r"/courses/(\d+)/files/(\d+)/download", path)
+                if m and int(m[2]) in stub.site["files"]:
+                    return self.redirect(f"/blobs/{m[2]}")
+
+                m = re.fullmatch(r"/blobs/(\d+)", path)
+                if m and int(m[1]) in stub.site["files"]:
+                    return self.send_blob(stub.site["files"][int(m[1])])
+
+                m = re.fullmatch(r"/api/v1/courses/(\d+)/(modules|files)", path)
+                if m and m[1] in stub.courses:
+                    return self.send_api_page(url, stub.courses[m[1]], m[2])
+
+                self.send(404, "Not Found", "text/plain")
+
+            def send_blob(self, file):
+                size = file["size"]
+                start, status, headers = 0, 200, {"Accept-Ranges": "bytes", "Content-Type": "application/octet-stream"}
+                m = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+                if m:
+                    start = int(m[1])
+                    if start >= size:
+                        return self.send(416, headers={"Content-Range": f"bytes */{size}"})
+                    status = 206
+                    headers["Content-Range"] = f"bytes {start}-{size - 1}/{size}"
+                self.send_response(status)
+                headers["Content-Length"] = str(size - start)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if self.command == "HEAD":
+                    return
+                remaining = size - start
+                offset = start % len(CHUNK)
+                while remaining:
+                    block = CHUNK[offset:offset + remaining]
+                    self.wfile.write(block)
+                    remaining -= len(block)
+                    offset = 0
+                stub.count("bytes", size - start)
+
+            def send_api_page(self, url, course, kind):
+                query = parse_qs(url.query)
+                per_page = int(query.get("per_page", ["10"])[0])
+                page = int(query.get("page", ["1"])[0])
+                if kind == "modules":
+                    records = [
+                        {"id": module["id"], "name": module["name"], "position": pos,
+                         "items": [{"id": item["id"], "title": item["title"], "type": item["type"],
+                                    "content_id": item.get("file_id", item["id"])}
+                                   for item in module["items"]]}
+                        for pos, module in enumerate(course["modules"], 1)
+                    ]
+                else:
+                    records = [
+                        {"id": fid, "display_name": f["name"], "filename": f["name"], "size": f["size"],
+                         "updated_at": "2025-01-01T00:00:00Z"}
+                        for fid, f in stub.site["files"].items() if stub.file_course[fid] == course["id"]
+                    ]
+                chunk = records[(page - 1) * per_page:page * per_page]
+                headers = {}
+                if page * per_page < len(records):
+                    headers["Link"] = (f'<{stub.base_url}/api/v1/courses/{course["id"]}/{kind}'
+                                       f'?per_page={per_page}&page={page + 1}>; rel="next"')
+                # Canvas prefixes JSON with this guard for cookie-authenticated requests
+                self.send(200, "while(1);" + json.dumps(chunk), "application/json", headers)
+
+        return Handler
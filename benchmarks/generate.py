@@ -0,0 +1,92 @@
+# benchmarks/generate.py
+"""Synthetic Canvas site generator for the benchmark stand-in server.
+
+A site is a plain dict:
+
+    {"courses": [{"id", "name", "modules": [{"id", "name", "items": [...]}]}],
+     "files": {file_id: {"name", "size"}}}
+
+Each item is {"id", "title", "type", ...}: "File" items carry a "file_id",
+"Page" items a "slug" and the "file_ids" their body links to, and
+"Assignment" items have no files (they exercise the no-download path).
+"""
+import random
+
+# Fractions of module items by type
+ITEM_MIX = [("File", 0.7), ("Page", 0.2), ("Assignment", 0.1)]
+
+EXTENSIONS = [".pdf", ".pdf", ".pdf", ".pptx", ".docx", ".xlsx", ".zip", ".mp4"]
+
+def _size_small(rng):
+    # Handouts and slides: lognormal around ~200 KB
+    return int(min(rng.lognormvariate(12.2, 1.0), 20 * 1024 * 1024))
+
+def _size_mixed(rng):
+    # Mostly documents, with the occasional lecture recording
+    if rng.random() < 0.03:
+        return rng.randint(50, 400) * 1024 * 1024
+    return _size_small(rng)
+
+SIZE_DISTRIBUTIONS = {
+    "small": _size_small,
+    "mixed": _size_mixed,
+}
+
+def size_sampler(spec):
+    """Resolve a distribution name, or "fixed:<bytes>", to a sampler taking an RNG."""
+    if spec.startswith("fixed:"):
+        size = int(spec.split(":", 1)[1])
+        return lambda rng: size
+    return SIZE_DISTRIBUTIONS[spec]
+
+def _pick_type(rng):
+    roll = rng.random()
+    for item_type, share in ITEM_MIX:
+        if roll < share:
+            return item_type
+        roll -= share
+    return ITEM_MIX[-1][0]
+
+def generate_site(courses=5, modules=8, items=10, sizes="small", size_scale=1.0, links_per_page=3, seed=1):
+    """Build N courses x M modules x K items with file sizes from the named distribution."""
+    rng = random.Random(seed)
+    sample = size_sampler(sizes)
+    site = {"courses": [], "files": {}}
+    next_id = 1000
+
+    def new_file(label):
+        nonlocal next_id
+        next_id += 1
+        site["files"][next_id] = {
+            "name": f"{label}{rng.choice(EXTENSIONS)}",
+            "size": max(1, int(sample(rng) * size_scale)),
+        }
+        return next_id
+
+    for c in range(1, courses + 1):
+        course = {"id": 100 + c, "name": f"Course {c:02d}", "modules": []}
+        for m in range(1, modules + 1):
+            module = {"id": c * 1000 + m, "name": f"Week {m}", "items": []}
+            for i in range(1, items + 1):
+                item_id = c * 100000 + m * 100 + i
+                item_type = _pick_type(rng)
+                item = {"id": item_id, "title": f"Item {m}.{i}", "type": item_type}
+                if item_type == "File":
+                    item["file_id"] = new_file(f"c{c}_w{m}_handout{i}")
+                elif item_type == "Page":
+                    item["slug"] = f"week-{m}-page-{i}"
+                    item["file_ids"] = [new_file(f"c{c}_w{m}_p{i}_attachment{k}") for k in range(links_per_page)]
+                module["items"].append(item)
+            course["modules"].append(module)
+        site["courses"].append(course)
+    return site
+
+def site_stats(site):
+    files = site["files"]
+    return {
+        "courses": len(site["courses"]),
+        "modules": sum(len(c["modules"]) for c in site["courses"]),
+        "items": sum(len(m["items"]) for c in site["courses"] for m in c["modules"]),
+        "files": len(files),
+        "bytes": sum(f["size"] for f in files.values()),
+    }
@@ -0,0 +1,257 @@
+# benchmarks/run_benchmarks.py
+"""End-to-end benchmark of indexing and downloading against a local Canvas stand-in.
+
+Generates a synthetic site, serves it with canvas_stub.CanvasStub, writes a
+throwaway config.json and cookie file into a temp directory and runs:
+
+    index     cold index_courses_and_files over the whole site
+    reindex   incremental re-index (unchanged site, so fingerprints and the HTTP cache apply)
+    download  DownloadManager over every indexed file
+
+For each phase it reports wall time, requests/sec seen by the server,
+files/sec, MB/s, CPU time spent in the HTML parse functions and peak RSS
+(ru_maxrss is a high-water mark, so later phases include earlier ones).
+
+    python benchmarks/run_benchmarks.py --courses 5 --modules 8 --items 10 --latency 0.02
+    python benchmarks/run_benchmarks.py --sizes fixed:5000000 --throttle 0.05 --json report.json
+
+Any config.json key can be overridden with --set KEY=JSON_VALUE. Requests are
+paced as configured; --set WAIT_BETWEEN_REQUESTS=0 measures the client alone.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+from functools import wraps
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import indexer
+from auth import create_session
+from config import reload_config
+from download_manager import DownloadManager
+from download_log import load_download_log
+from generate import generate_site, site_stats
+from canvas_stub import CanvasStub
+
+# Functions in indexer's namespace that turn HTML into data
+PARSE_FUNCTIONS = ["parse_courses", "parse_modules_and_items", "parse_file_download_link"]
+
+class ParseTimer:
+    """Accumulate per-thread CPU time spent inside the wrapped parse functions."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = 0.0
+        self.calls = 0
+        self.originals = {}
+
+    def install(self):
+        for name in PARSE_FUNCTIONS:
+            original = getattr(indexer, name)
+            self.originals[name] = original
+            setattr(indexer, name, self._wrap(original))
+
+    def uninstall(self):
+        for name, original in self.originals.items():
+            setattr(indexer, name, original)
+
+    def reset(self):
+        with self.lock:
+            self.seconds = 0.0
+            self.calls = 0
+
+    def _wrap(self, func):
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.thread_time() - start
+                with self.lock:
+                    self.seconds += elapsed
+                    self.calls += 1
+        return timed
+
+def peak_rss_mb():
+    # Linux reports kilobytes, macOS bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def write_config(workdir, base_url, overrides):
+    with open(os.path.join(REPO_DIR, "config.json")) as f:
+        config = json.load(f)
+    # Absolute paths so module-level registries keyed by path never see a stale cwd
+    config.update({
+        "BASE_URL": base_url,
+        "COOKIES_FILE": os.path.join(workdir, "canvas_cookies.json"),
+        "DOWNLOAD_DIR": os.path.join(workdir, "CanvasDownloads"),
+        "SCRIPT_LOG_FILE": os.path.join(workdir, "logs", "script.log"),
+        "DATA_FILE": os.path.join(workdir, "data", "canvas_data.json"),
+        "INDEX_DB_FILE": os.path.join(workdir, "data", "canvas_data.db"),
+        "DOWNLOAD_LOG_FILE": os.path.join(workdir, "data", "download_log.json"),
+        "HTTP_CACHE_FILE": os.path.join(workdir, "data", "http_cache.json"),
+        "BLOB_DIR": os.path.join(workdir, "CanvasDownloads", ".blobs"),
+        "static_settings": True,
+        "always_reindex": True,
+        "incremental_reindex": False,
+        "always_redownload": False,
+    })
+    config.update(overrides)
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+    with open(config["COOKIES_FILE"], "w") as f:
+        json.dump({}, f)
+    return config
+
+def set_config(workdir, **changes):
+    path = os.path.join(workdir, "config.json")
+    with open(path) as f:
+        config = json.load(f)
+    config.update(changes)
+    with open(path, "w") as f:
+        json.dump(config, f, indent=4)
+    return reload_config(path)
+
+def measure(name, stub, timer, func):
+    stub.reset_counts()
+    timer.reset()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = func()
+    seconds = time.perf_counter() - start
+    requests_made = stub.total_requests()
+    return result, {
+        "phase": name,
+        "seconds": seconds,
+        "cpu_seconds": time.process_time() - cpu_start,
+        "requests": requests_made,
+        "requests_per_second": requests_made / max(seconds, 1e-9),
+        "throttled": stub.counts.get("throttled", 0),
+        "bytes_served": stub.counts.get("bytes", 0),
+        "parse_cpu_seconds": timer.seconds,
+        "parse_calls": timer.calls,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def run(args):
+    site = generate_site(args.courses, args.modules, args.items, args.sizes, args.size_scale, args.links_per_page, args.seed)
+    stats = site_stats(site)
+    stub = CanvasStub(site, latency=args.latency, throttle_rate=args.throttle, retry_after=args.retry_after).start()
+    workdir = tempfile.mkdtemp(prefix="canvas-bench-")
+    cwd = os.getcwd()
+    timer = ParseTimer()
+    phases = []
+    try:
+        os.chdir(workdir)
+        config = write_config(workdir, stub.base_url, dict(args.overrides))
+        timer.install()
+        session = create_session()
+
+        data, phase = measure("index", stub, timer, lambda: indexer.index_courses_and_files(session))
+        phase["files"] = data["total_files"]
+        phase["files_per_second"] = data["total_files"] / max(phase["seconds"], 1e-9)
+        phases.append(phase)
+
+        if not args.skip_reindex:
+            set_config(workdir, incremental_reindex=True)
+            data, phase = measure("reindex", stub, timer, lambda: indexer.index_courses_and_files(session))
+            phase["files"] = data["total_files"]
+            phase["files_per_second"] = data["total_files"] / max(phase["seconds"], 1e-9)
+            phases.append(phase)
+
+        if not args.skip_download:
+            def download():
+                download_log = load_download_log()
+                manager = DownloadManager(session, config, download_log, on_complete=indexer.mark_file_downloaded)
+                try:
+                    return manager.run([f for f in indexer.iter_files(data) if not f["downloaded"]])
+                finally:
+                    download_log.close()
+            summary, phase = measure("download", stub, timer, download)
+            phase.update(
+                files=summary["completed"],
+                failed=summary["failed"],
+                bytes=summary["bytes"],
+                files_per_second=summary["completed"] / max(phase["seconds"], 1e-9),
+                mb_per_second=summary["bytes"] / 1024 / 1024 / max(phase["seconds"], 1e-9),
+            )
+            phases.append(phase)
+    finally:
+        timer.uninstall()
+        os.chdir(cwd)
+        stub.stop()
+        if args.keep:
+            print(f"Benchmark files kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "site": stats,
+        "settings": {
+            "latency": args.latency,
+            "throttle": args.throttle,
+            "sizes": args.sizes,
+            "size_scale": args.size_scale,
+            "overrides": dict(args.overrides),
+        },
+        "phases": phases,
+    }
+
+def print_report(report):
+    s = report["site"]
+    print(f"\nSite: {s['courses']} courses, {s['modules']} modules, {s['items']} items, "
+          f"{s['files']} files ({s['bytes']/1024/1024:.1f} MB)")
+    header = f"{'phase':<10}{'seconds':>9}{'req/s':>9}{'files/s':>10}{'MB/s':>9}{'parse s':>9}{'429s':>6}{'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for p in report["phases"]:
+        mb = f"{p['mb_per_second']:.1f}" if "mb_per_second" in p else "-"
+        print(f"{p['phase']:<10}{p['seconds']:>9.2f}{p['requests_per_second']:>9.1f}{p.get('files_per_second', 0):>10.1f}"
+              f"{mb:>9}{p['parse_cpu_seconds']:>9.2f}{p['throttled']:>6}{p['peak_rss_mb']:>9.1f}")
+
+def parse_override(text):
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--courses", type=int, default=5)
+    parser.add_argument("--modules", type=int, default=8)
+    parser.add_argument("--items", type=int, default=10, help="items per module")
+    parser.add_argument("--links-per-page", type=int, default=3)
+    parser.add_argument("--sizes", default="small", help='"small", "mixed" or "fixed:<bytes>"')
+    parser.add_argument("--size-scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--throttle", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--set", dest="overrides", action="append", type=parse_override, default=[],
+                        metavar="KEY=VALUE", help="override a config.json key (value parsed as JSON)")
+    parser.add_argument("--skip-reindex", action="store_true")
+    parser.add_argument("--skip-download", action="store_true")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary work directory")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
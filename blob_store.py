@@ -0,0 +1,155 @@
+# blob_store.py
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+import logging
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+CANVAS_FILE_ID = re.compile(r'/files/(\d+)')
+FICLONE = 0x40049409  # Linux ioctl for reflink copies (btrfs, xfs)
+
+def canonical_key(url):
+    """Identify the remote file behind a URL: host + Canvas file id when present, else the full URL."""
+    parsed = urlparse(url)
+    match = CANVAS_FILE_ID.search(parsed.path)
+    if match:
+        return f"{parsed.netloc}/files/{match.group(1)}"
+    return url
+
+def hash_file(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _clone_file(src, dst):
+    """Reflink `src` to `dst` where the filesystem supports it, else copy it."""
+    try:
+        import fcntl
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(src, dst)
+
+def _link_or_clone(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        _clone_file(src, dst)
+
+class BlobStore:
+    """Content-addressed store of downloaded files.
+
+    Each distinct file body is kept once as `<root>/<aa>/<sha256>`, and every
+    course/module path is a hardlink to it (or a reflink/copy where hardlinks
+    aren't possible). `keys` maps a file's canonical URL key to its digest so
+    a file already fetched through another module or course can be linked
+    without downloading it again.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.index_file = os.path.join(root, "index.json")
+        self.keys = {}
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        os.makedirs(root, exist_ok=True)
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, "r") as f:
+                    self.keys = json.load(f)
+            except Exception as e:
+                logger.info(f"Failed to load blob index: {e}")
+
+    @classmethod
+    def from_config(cls, config):
+        """The store described by config, or None if DEDUPE is off."""
+        if not config.get("DEDUPE", False):
+            return None
+        return cls(config.get("BLOB_DIR") or os.path.join(config["DOWNLOAD_DIR"], ".blobs"))
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def key_lock(self, key):
+        """Lock serializing work on one remote file, so concurrent links to it download once."""
+        with self.lock:
+            if key not in self.key_locks:
+                self.key_locks[key] = threading.Lock()
+            return self.key_locks[key]
+
+    def lookup(self, key, size=0):
+        """Digest of the stored blob for `key`, or None if it isn't stored.
+
+        When `size` is known and the blob has a different size (the file was
+        replaced on Canvas, or the blob is damaged), the key is forgotten and
+        None is returned so the file is downloaded again.
+        """
+        with self.lock:
+            digest = self.keys.get(key)
+        if not digest:
+            return None
+        try:
+            blob_size = os.path.getsize(self.blob_path(digest))
+        except OSError:
+            return None
+        if size and blob_size != size:
+            logger.info(f"Stored blob for {key} has {blob_size} bytes, expected {size}; downloading again")
+            self.forget(key)
+            return None
+        return digest
+
+    def forget(self, key):
+        """Drop the digest stored for `key` and return it."""
+        with self.lock:
+            return self.keys.pop(key, None)
+
+    def materialize(self, digest, path):
+        """Place the blob for `digest` at `path`."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + ".link"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        _link_or_clone(self.blob_path(digest), tmp_path)
+        os.replace(tmp_path, path)
+
+    def ingest(self, path, key=None):
+        """Move a freshly downloaded file into the store and link it back.
+
+        Returns (digest, duplicate) where duplicate is True if identical
+        content was already stored and `path` now shares that blob.
+        """
+        digest = hash_file(path)
+        blob = self.blob_path(digest)
+        size = os.path.getsize(path)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        with self.lock:
+            duplicate = os.path.exists(blob) and os.path.getsize(blob) == size
+            if not duplicate:
+                # No blob yet, or a damaged one that must not be linked over the good download
+                tmp_blob = blob + ".tmp"
+                if os.path.exists(tmp_blob):
+                    os.remove(tmp_blob)
+                _link_or_clone(path, tmp_blob)
+                os.replace(tmp_blob, blob)
+            if key:
+                self.keys[key] = digest
+        if duplicate and not os.path.samefile(blob, path):
+            self.materialize(digest, path)
+        return digest, duplicate
+
+    def save(self):
+        tmp_file = self.index_file + ".tmp"
+        # Managers sharing the store (batch mode) may save at the same time
+        with self.lock:
+            with open(tmp_file, "w") as f:
+                json.dump(self.keys, f)
+            os.replace(tmp_file, self.index_file)
@@ -0,0 +1,90 @@
+# canvas_api.py
+import json
+import logging
+from logger import error_extra
+from utils import clean_filename
+
+logger = logging.getLogger(__name__)
+
+# Module item types that never lead to a downloadable file page
+SKIPPED_ITEM_TYPES = {"SubHeader", "ExternalUrl", "ExternalTool"}
+
+def parse_json(response):
+    """Decode a Canvas API response, stripping the while(1); guard added for cookie sessions."""
+    text = response.text
+    if text.startswith("while(1);"):
+        text = text[len("while(1);"):]
+    return json.loads(text)
+
+def iter_api_pages(session, url, params=None):
+    """Yield every element of a paginated Canvas API list, following Link rel="next"."""
+    while url:
+        response = session.get(url, params=params, headers={"Accept": "application/json"})
+        response.raise_for_status()
+        yield from parse_json(response)
+        url = response.links.get("next", {}).get("url")
+        # The next link already carries the query string
+        params = None
+
+def fetch_course_files(session, base_url, course_id):
+    """Map file id -> file JSON for a course, or None if the files list isn't visible to us."""
+    try:
+        return {
+            str(f["id"]): f
+            for f in iter_api_pages(session, f"{base_url}/api/v1/courses/{course_id}/files", {"per_page": 100})
+        }
+    except Exception as e:
+        logger.info(f"Course files list unavailable, looking up files individually: {e}", extra=error_extra(e))
+        return None
+
+def fetch_file(session, base_url, course_id, file_id):
+    response = session.get(f"{base_url}/api/v1/courses/{course_id}/files/{file_id}", headers={"Accept": "application/json"})
+    response.raise_for_status()
+    return parse_json(response)
+
+def fetch_course_modules(session, base_url, course_id):
+    """Fetch a course's modules through the API.
+
+    Returns (modules, item_files). `modules` has the same shape as
+    scraper.parse_modules_and_items, so fingerprints match the HTML backend.
+    `item_files` maps a module item URL to the (name, download_url, size,
+    updated_at) tuples the API resolved for it; items missing from it still
+    need the HTML scraper.
+    """
+    modules = []
+    file_items = []
+    item_files = {}
+    for module in iter_api_pages(session, f"{base_url}/api/v1/courses/{course_id}/modules",
+                                 {"include[]": "items", "per_page": 100}):
+        items = module.get("items")
+        if items is None:
+            # Canvas omits inline items for very large modules
+            items = list(iter_api_pages(session, module["items_url"], {"per_page": 100}))
+        module_items = []
+        for item in items:
+            if item.get("type") == "SubHeader":
+                continue
+            item_url = f"{base_url}/courses/{course_id}/modules/items/{item['id']}"
+            module_items.append({'title': item.get("title", "").strip(), 'url': item_url})
+            if item.get("type") == "File" and item.get("content_id"):
+                file_items.append((item_url, str(item["content_id"])))
+            elif item.get("type") in SKIPPED_ITEM_TYPES:
+                item_files[item_url] = []
+        module_name = clean_filename(module.get("name", "").strip()) or "UnknownModule"
+        modules.append({'name': module_name, 'items': module_items})
+
+    files = fetch_course_files(session, base_url, course_id) if file_items else {}
+    for item_url, file_id in file_items:
+        info = files.get(file_id) if files is not None else None
+        if info is None:
+            try:
+                info = fetch_file(session, base_url, course_id, file_id)
+            except Exception as e:
+                logger.info(f"File {file_id} not available through the API: {e}", extra=error_extra(e))
+                continue
+        if info.get("locked_for_user"):
+            continue
+        download_url = f"{base_url}/courses/{course_id}/files/{file_id}/download?download_frd=1"
+        name = clean_filename(info.get("display_name") or info.get("filename", ""))
+        item_files[item_url] = [(name, download_url, info.get("size", 0), info.get("updated_at"))]
+    return modules, item_files
@@ -1,7 +1,210 @@
 # config.py
+import os
+import re
 import json
+import threading
+
+REQUIRED_KEYS = ("BASE_URL", "COOKIES_FILE", "DOWNLOAD_DIR", "SCRIPT_LOG_FILE", "DATA_FILE")
+
+def _number(minimum):
+    def check(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and value >= minimum
+    check.expected = f"a number >= {minimum}"
+    return check
+
+def _integer(minimum):
+    def check(value):
+        return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
+    check.expected = f"an integer >= {minimum}"
+    return check
+
+def _one_of(*choices):
+    def check(value):
+        return value in choices
+    check.expected = "one of " + ", ".join(f'"{c}"' for c in choices)
+    return check
+
+def _boolean(value):
+    return isinstance(value, bool)
+_boolean.expected = "true or false"
+
+def _optional_string(value):
+    return value is None or isinstance(value, str)
+_optional_string.expected = "a string or null"
+
+def _accounts(value):
+    if not isinstance(value, list):
+        return False
+    names = [a.get("name") if isinstance(a, dict) else None for a in value]
+    return all(isinstance(n, str) and n and re.fullmatch(r"[\w.-]+", n) for n in names) and len(set(names)) == len(names)
+_accounts.expected = 'a list of objects with unique "name"s (letters, digits, "_", "-", ".")'
+
+def _hhmm(value):
+    return isinstance(value, str) and re.fullmatch(r"([01]?\d|2[0-3]):[0-5]\d", value) is not None
+
+# Checks for known options; keys not listed here are accepted as-is
+VALIDATORS = {
+    "BASE_URL": lambda v: isinstance(v, str) and v.startswith(("http://", "https://")),
+    "WAIT_BETWEEN_REQUESTS": _number(0),
+    "RATE_LIMIT_BURST": _integer(1),
+    "MAX_RETRIES": _integer(0),
+    "BACKOFF_BASE": _number(0),
+    "MAX_BACKOFF": _number(0),
+    "MAX_LOG_FILES": _integer(0),
+    "INDEX_STORE": _one_of("json", "sqlite"),
+    "INDEX_JSON_EXPORT": _boolean,
+    "DOWNLOAD_LOG_FSYNC_EVERY": _integer(1),
+    "DOWNLOAD_LOG_COMPACT_EVERY": _integer(1),
+    "INDEX_SOURCE": _one_of("html", "api"),
+    "INDEX_WORKERS": _integer(1),
+    "HTML_PARSER": _one_of("auto", "lxml", "html.parser", "html5lib"),
+    "DOWNLOAD_WORKERS": _integer(1),
+    "MAX_CONNECTIONS_PER_HOST": _integer(1),
+    "DOWNLOAD_CHUNK_SIZE": _integer(65536),
+    "DOWNLOAD_PREALLOCATE": _boolean,
+    "VERIFY_WORKERS": _integer(0),
+    "PIPELINE_DOWNLOADS": _boolean,
+    "DOWNLOAD_ORDER": _one_of("crawl", "smallest_first", "priority_first", "interleaved"),
+    "COURSE_PRIORITIES": lambda v: isinstance(v, list) and all(isinstance(p, str) for p in v),
+    "MAX_BYTES_PER_SECOND": _number(0),
+    "BANDWIDTH_SCHEDULE": lambda v: isinstance(v, list) and all(
+        isinstance(w, dict) and _hhmm(w.get("start")) and _hhmm(w.get("end")) and _number(0)(w.get("bytes_per_second"))
+        for w in v),
+    "DEDUPE": _boolean,
+    "BLOB_DIR": _optional_string,
+    "HTTP_CACHE": _boolean,
+    "HTTP_CACHE_TTL": _number(0),
+    "HTTP_CACHE_MAX_AGE": _number(0),
+    "HTTP_CACHE_MAX_ENTRIES": _integer(1),
+    "EXPORT_PAGES": _boolean,
+    "EXPORT_WORKERS": _integer(0),
+    "NEGATIVE_CACHE": _boolean,
+    "NEGATIVE_CACHE_TTLS": lambda v: isinstance(v, dict),
+    "WATCH_INTERVAL": _number(1),
+    "WATCH_MIN_INTERVAL": _number(1),
+    "WATCH_MAX_INTERVAL": _number(1),
+    "WATCH_JITTER": lambda v: isinstance(v, (int, float)) and 0 <= v < 1,
+    "WATCH_COURSE_LIST_INTERVAL": _number(1),
+    "ACCOUNTS": _accounts,
+    "static_settings": _boolean,
+    "always_reindex": _boolean,
+    "incremental_reindex": _boolean,
+    "always_redownload": _boolean,
+}
+VALIDATORS["BASE_URL"].expected = "an http:// or https:// URL"
+VALIDATORS["NEGATIVE_CACHE_TTLS"].expected = "an object"
+VALIDATORS["COURSE_PRIORITIES"].expected = "a list of strings"
+VALIDATORS["BANDWIDTH_SCHEDULE"].expected = 'a list of {"start": "HH:MM", "end": "HH:MM", "bytes_per_second": N} objects'
+VALIDATORS["WATCH_JITTER"].expected = "a fraction from 0 to below 1"
+
+# State files each account in batch mode gets its own copy of, under data/accounts/<name>/
+ACCOUNT_STATE_FILES = {
+    "DATA_FILE": "canvas_data.json",
+    "INDEX_DB_FILE": "canvas_data.db",
+    "DOWNLOAD_LOG_FILE": "download_log.json",
+    "HTTP_CACHE_FILE": "http_cache.json",
+    "NEGATIVE_CACHE_FILE": "negative_cache.json",
+    "EXPORT_CACHE_FILE": "page_exports.json",
+}
+
+class ConfigError(ValueError):
+    pass
+
+def validate_config(values, source="config.json"):
+    """Raise ConfigError listing every missing or malformed option."""
+    problems = [f"{key} is missing" for key in REQUIRED_KEYS if key not in values]
+    for key, check in VALIDATORS.items():
+        if key in values and not check(values[key]):
+            problems.append(f"{key} must be {check.expected}, got {values[key]!r}")
+    if problems:
+        raise ConfigError(f"Invalid {source}: " + "; ".join(problems))
+
+class Config(dict):
+    """Validated settings from a config file, shared by every load_config() caller.
+
+    It is a dict, so config["KEY"] and config.get("KEY", default) work as
+    before. reload() updates it in place, so holders of the object see
+    new values.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.mtime = None
+
+    def _signature(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def reload(self):
+        """Re-read the file if it changed since the last load. Returns True if it was re-read.
+
+        Raises ConfigError if the file is not valid JSON or fails validation,
+        leaving the current values in place. New values are written before
+        removed keys are deleted, so a thread reading the config during a
+        reload never sees a key missing that both versions have.
+        """
+        signature = self._signature()
+        if signature == self.mtime:
+            return False
+        with open(self.path) as f:
+            try:
+                values = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ConfigError(f"{self.path} is not valid JSON: {e}") from e
+        validate_config(values, self.path)
+        self.update(values)
+        for key in [key for key in self if key not in values]:
+            del self[key]
+        self.mtime = signature
+        return True
+
+def account_configs(config):
+    """Settings for each ACCOUNTS entry: `config` overlaid with the entry's own keys.
+
+    State files default to data/accounts/<name>/ and static_settings is
+    always on, since accounts run unattended side by side. Each result is
+    validated like config.json itself.
+    """
+    accounts = []
+    for account in config.get("ACCOUNTS") or []:
+        name = account["name"]
+        values = {k: v for k, v in config.items() if k != "ACCOUNTS"}
+        values.update({key: os.path.join("data", "accounts", name, filename) for key, filename in ACCOUNT_STATE_FILES.items()})
+        values.update({k: v for k, v in account.items() if k != "name"})
+        values["ACCOUNT_NAME"] = name
+        values["static_settings"] = True
+        validate_config(values, f"account {name!r}")
+        accounts.append(values)
+    return accounts
+
+_configs = {}
+_configs_lock = threading.Lock()
 
 def load_config(config_file="config.json"):
-    """Load configuration from a JSON file."""
-    with open(config_file) as f:
-        return json.load(f)
+    """Load configuration from a JSON file.
+
+    The file is read and validated once per path. Later calls return the
+    same Config; call reload_config() to pick up edits.
+    """
+    path = os.path.abspath(config_file)
+    config = _configs.get(path)
+    if config is None:
+        with _configs_lock:
+            config = _configs.get(path)
+            if config is None:
+                config = Config(path)
+                config.reload()
+                _configs[path] = config
+    return config
+
+def reload_config(config_file="config.json"):
+    """Return the shared Config for `config_file`, re-reading it if its mtime or size changed.
+
+    Reloads are serialized by a lock, so threads that reload the shared
+    object at the same time (download workers, the watcher) don't interleave.
+    """
+    config = load_config(config_file)
+    with _configs_lock:
+        config.reload()
+    return config
@@ -1,27 +1,139 @@
 # download_log.py
 import os
 import json
+import threading
 from config import load_config
 
-def get_log_file():
-    config = load_config()
-    log_file = config["DOWNLOAD_LOG_FILE"]
+def get_log_file(config=None):
+    config = config or load_config()
+    log_file = config.get("DOWNLOAD_LOG_FILE", "data/download_log.json")
     os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
     return log_file
 
-def load_download_log():
+class DownloadLog(dict):
+    """Download log kept as a JSON snapshot plus an append-only journal.
+
+    Setting a new key appends one compact JSON line to `<log_file>.journal`
+    instead of rewriting the whole log. The journal is fsynced every
+    `fsync_every` records and folded back into the snapshot every
+    `compact_every` records (and on close). Loading replays the journal over
+    the snapshot, so at most the last unsynced batch is lost on a crash.
+    Lookups are plain dict lookups.
+    """
+
+    def __init__(self, log_file, fsync_every=50, compact_every=1000):
+        super().__init__()
+        self.log_file = log_file
+        self.journal_file = log_file + ".journal"
+        self.fsync_every = fsync_every
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        self.journal = None
+        self.unsynced = 0
+        self.journaled = 0
+
+    def load(self):
+        try:
+            if os.path.exists(self.log_file):
+                with open(self.log_file, "r") as f:
+                    super().update(json.load(f))
+        except Exception as e:
+            print(f"Warning: Could not load download log: {e}")
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-append
+                        continue
+                    if record.get("removed"):
+                        super().pop(record["path"], None)
+                    else:
+                        super().__setitem__(record["path"], True)
+                    self.journaled += 1
+        return self
+
+    def _append(self, record):
+        if self.journal is None:
+            self.journal = open(self.journal_file, "a")
+        self.journal.write(json.dumps(record, separators=(',', ':')) + "\n")
+        self.unsynced += 1
+        self.journaled += 1
+        if self.unsynced >= self.fsync_every:
+            self._sync()
+        if self.journaled >= self.compact_every:
+            self._compact()
+
+    def _sync(self):
+        if self.journal is not None and self.unsynced:
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.unsynced = 0
+
+    def _compact(self):
+        tmp_file = self.log_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(dict(self), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.log_file)
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        open(self.journal_file, "w").close()
+        self.unsynced = 0
+        self.journaled = 0
+
+    def __setitem__(self, path, value):
+        with self.lock:
+            if value and self.get(path):
+                return
+            super().__setitem__(path, value)
+            self._append({"path": path} if value else {"path": path, "removed": True})
+
+    def __delitem__(self, path):
+        with self.lock:
+            super().__delitem__(path)
+            self._append({"path": path, "removed": True})
+
+    def merge(self, entries):
+        """Journal any entries from another log that this one doesn't have yet."""
+        for path, value in entries.items():
+            if value:
+                self[path] = value
+
+    def flush(self):
+        with self.lock:
+            self._sync()
+
+    def compact(self):
+        with self.lock:
+            self._compact()
+
+    def close(self):
+        with self.lock:
+            self._sync()
+            if self.journaled:
+                self._compact()
+            elif self.journal is not None:
+                self.journal.close()
+                self.journal = None
+
+def load_download_log(config=None):
     """Load the download log from file. Creates an empty log if the file doesn't exist."""
-    log_file = get_log_file()
-    try:
-        if os.path.exists(log_file):
-            with open(log_file, "r") as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"Warning: Could not load download log: {e}")
-    return {}
+    config = config or load_config()
+    return DownloadLog(
+        get_log_file(config),
+        fsync_every=config.get("DOWNLOAD_LOG_FSYNC_EVERY", 50),
+        compact_every=config.get("DOWNLOAD_LOG_COMPACT_EVERY", 1000)
+    ).load()
 
 def save_download_log(log):
     """Save the download log to file."""
+    if isinstance(log, DownloadLog):
+        log.compact()
+        return
     log_file = get_log_file()
     try:
         with open(log_file, "w") as f:
@@ -36,4 +148,5 @@ def is_already_downloaded(file_path, log):
 def add_to_download_log(file_path, log):
     """Add a file to the download log."""
     log[os.path.abspath(file_path)] = True
-    save_download_log(log)
+    if not isinstance(log, DownloadLog):
+        save_download_log(log)
@@ -0,0 +1,227 @@
+# download_manager.py
+import os
+import sys
+import time
+import threading
+import logging
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import requests
+from downloader import download_file
+from manifest import get_manifest
+from blob_store import BlobStore, canonical_key
+from metrics import get_metrics
+from logger import error_extra
+from negative_cache import get_negative_cache, failure_status
+from download_scheduler import BandwidthLimiter
+
+logger = logging.getLogger(__name__)
+
+class HostSlots:
+    """One semaphore per host, bounding simultaneous transfers to it. Can be shared by several managers."""
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self.lock = threading.Lock()
+        self.slots = {}
+
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.slots:
+                self.slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self.slots[host]
+
+class DownloadManager:
+    """Download index file records on a bounded worker pool.
+
+    Each host gets its own semaphore so no more than MAX_CONNECTIONS_PER_HOST
+    transfers hit it at once. Byte progress from every worker is folded into a
+    single tqdm bar, and shared state (the file records and the download log)
+    is only touched under the manager's lock. `on_complete(file)` is called
+    from the worker after each successful download, `on_failed(file, error)`
+    after each failed one and `on_skipped(file)` for each file skipped as
+    recently failed.
+
+    With DEDUPE enabled, files go through a BlobStore: a file whose canonical
+    Canvas id was already fetched is linked instead of downloaded, and new
+    downloads whose content matches a stored blob are collapsed onto it.
+
+    URLs that failed recently (see NegativeCache) are skipped without a
+    request and counted in the summary. A new file is only taken from
+    `files` when a worker is free, so a DownloadQueue's ordering applies to
+    files that arrive while others are downloading. All workers share one
+    BandwidthLimiter (MAX_BYTES_PER_SECOND / BANDWIDTH_SCHEDULE).
+
+    `blob_store`, `limiter` and `host_slots` can be passed in to share them
+    between managers, as batch mode does across accounts.
+    """
+
+    def __init__(self, session, config, download_log, on_complete=None, blob_store=None, on_failed=None,
+                 limiter=None, host_slots=None, on_skipped=None):
+        self.session = session
+        self.config = config
+        self.download_log = download_log
+        self.on_complete = on_complete
+        self.on_failed = on_failed
+        self.on_skipped = on_skipped
+        self.blob_store = blob_store or BlobStore.from_config(config)
+        self.manifest = get_manifest(config["DOWNLOAD_DIR"])
+        self.negative = get_negative_cache(config)
+        self.limiter = limiter or BandwidthLimiter.from_config(config)
+        self.workers = max(1, int(config.get("DOWNLOAD_WORKERS", 4)))
+        self.per_host = max(1, int(config.get("MAX_CONNECTIONS_PER_HOST", self.workers)))
+        self.lock = threading.Lock()
+        self.host_slots = host_slots or HostSlots(self.per_host)
+        self.submitted = 0
+        self.completed = []
+        self.failed = []
+        self.skipped = []
+        self.bytes_downloaded = 0
+        self.deduplicated = 0
+        self.bytes_deduplicated = 0
+        self.elapsed = 0.0
+
+    def _download(self, file, bar):
+        def progress(n):
+            self.limiter.consume(n)
+            with self.lock:
+                self.bytes_downloaded += n
+                bar.update(n)
+
+        if self.blob_store:
+            self._download_deduplicated(file, bar, progress)
+        else:
+            self._transfer(file, progress)
+        entry = self.manifest.stat(file["path"])
+        with self.lock:
+            if entry:
+                # Replace a size guessed from a HEAD with the bytes actually written
+                file["size"] = entry[0]
+                file["size_exact"] = True
+            file["downloaded"] = True
+            self.download_log[self.manifest.abspath(file["path"])] = True
+        if self.on_complete:
+            self.on_complete(file)
+
+    def _transfer(self, file, progress):
+        with self.host_slots.slot(file["url"]):
+            try:
+                download_file(self.session, file["url"], file["path"], self.download_log, progress=progress,
+                              expected_size=file.get("size", 0), manifest=self.manifest, config=self.config)
+            except requests.RequestException as e:
+                if self.negative:
+                    self.negative.record_failure(file["url"], failure_status(e))
+                raise
+        if self.negative:
+            self.negative.record_success(file["url"])
+
+    def _download_deduplicated(self, file, bar, progress):
+        key = canonical_key(file["url"])
+        expected_size = file.get("size", 0)
+        with self.blob_store.key_lock(key):
+            # A blob of the wrong size is stale or damaged; lookup() treats it as a miss
+            digest = self.blob_store.lookup(key, expected_size)
+            get_metrics().incr("dedupe_lookups_total", result="miss" if digest is None else "hit")
+            if digest is None:
+                self._transfer(file, progress)
+                digest, duplicate = self.blob_store.ingest(file["path"], key)
+                if duplicate:
+                    with self.lock:
+                        self.deduplicated += 1
+                        self.bytes_deduplicated += os.path.getsize(file["path"])
+            elif not self.manifest.is_complete(file["path"], expected_size):
+                self.blob_store.materialize(digest, file["path"])
+                self.manifest.record(file["path"])
+                size = os.path.getsize(file["path"])
+                with self.lock:
+                    self.deduplicated += 1
+                    self.bytes_deduplicated += size
+                    bar.update(size)
+
+    def _finished(self, file, bar, future):
+        try:
+            future.result()
+            outcome = None
+        except Exception as e:
+            logger.info(f"Error downloading {file['name']}: {e}", extra=error_extra(e))
+            outcome = e
+        with self.lock:
+            if outcome is None:
+                self.completed.append(file)
+            else:
+                self.failed.append((file, outcome))
+            bar.set_postfix(files=f"{len(self.completed) + len(self.failed)}/{self.submitted}", refresh=False)
+        if outcome is not None and self.on_failed:
+            self.on_failed(file, outcome)
+
+    def run(self, files, total_bytes=0):
+        """Download every file record in `files` and return the summary dict.
+
+        `files` may be any iterable, including one fed from a queue while the
+        indexer is still running. The bar's byte total starts at `total_bytes`
+        if given, else it grows as records are taken.
+        """
+        from tqdm import tqdm
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, tqdm(
+            total=0,
+            unit='B',
+            unit_scale=True,
+            desc="Downloading",
+            file=sys.stdout
+        ) as bar:
+            bar.total = total_bytes
+            slots = threading.Semaphore(self.workers)
+            iterator = iter(files)
+            while True:
+                slots.acquire()
+                file = next(iterator, None)
+                if file is None:
+                    break
+                if self.negative and self.negative.should_skip(file["url"]):
+                    with self.lock:
+                        self.skipped.append(file)
+                    slots.release()
+                    if self.on_skipped:
+                        self.on_skipped(file)
+                    continue
+                with self.lock:
+                    self.submitted += 1
+                    if not total_bytes:
+                        bar.total += file.get("size", 0)
+                future = executor.submit(self._download, file, bar)
+                future.add_done_callback(partial(self._finished, file, bar))
+                future.add_done_callback(lambda _: slots.release())
+        self.elapsed = time.monotonic() - start
+        if self.blob_store:
+            self.blob_store.save()
+        if self.negative:
+            self.negative.save()
+        return self.summary()
+
+    def summary(self):
+        elapsed = max(self.elapsed, 1e-9)
+        return {
+            "completed": len(self.completed),
+            "failed": len(self.failed),
+            "skipped": len(self.skipped),
+            "bytes": self.bytes_downloaded,
+            "seconds": self.elapsed,
+            "mb_per_second": self.bytes_downloaded / 1024 / 1024 / elapsed,
+            "files_per_second": len(self.completed) / elapsed,
+            "deduplicated": self.deduplicated,
+            "bytes_deduplicated": self.bytes_deduplicated,
+        }
+
+    def print_summary(self):
+        s = self.summary()
+        print(f"\nDownloaded {s['completed']} files ({s['bytes']/1024/1024:.2f} MB) in {s['seconds']:.1f}s "
+              f"- {s['mb_per_second']:.2f} MB/s, {s['files_per_second']:.1f} files/s.")
+        if s["deduplicated"]:
+            print(f"{s['deduplicated']} files ({s['bytes_deduplicated']/1024/1024:.2f} MB) were shared with identical files and stored once.")
+        if self.failed:
+            print(f"{s['failed']} files failed:")
+            for file, e in self.failed:
+                print(f"  {file['name']}: {e}")
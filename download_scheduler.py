@@ -0,0 +1,190 @@
+# download_scheduler.py
+import os
+import time
+import heapq
+import threading
+import itertools
+import logging
+from datetime import datetime
+from config import Config, reload_config
+
+logger = logging.getLogger(__name__)
+
+ORDER_POLICIES = ("crawl", "smallest_first", "priority_first", "interleaved")
+
+def course_priority(course_name, priorities):
+    """Index of the first COURSE_PRIORITIES entry contained in `course_name` (case-insensitive), else len(priorities)."""
+    name = course_name.lower()
+    for rank, pattern in enumerate(priorities):
+        if str(pattern).lower() in name:
+            return rank
+    return len(priorities)
+
+class DownloadQueue:
+    """Blocking queue of file records that hands them out in DOWNLOAD_ORDER.
+
+    Policies:
+      crawl           the order files were found in
+      smallest_first  smallest known size first, so one big recording can't hold up many handouts
+      priority_first  by COURSE_PRIORITIES rank, then smallest first
+      interleaved     alternately the smallest and the largest file waiting
+
+    Files can be added while a consumer is iterating (pipelined and watch
+    mode); close() ends the iteration once the queue has drained. Course
+    names come from the record's path below `download_dir`.
+    """
+
+    def __init__(self, policy="crawl", priorities=None, download_dir=""):
+        if policy not in ORDER_POLICIES:
+            raise ValueError(f"Unknown download order {policy!r}, expected one of {', '.join(ORDER_POLICIES)}")
+        self.policy = policy
+        self.priorities = list(priorities or [])
+        self.download_dir = download_dir
+        self.condition = threading.Condition()
+        self.counter = itertools.count()
+        self.small = []
+        self.large = []
+        self.taken = set()
+        self.take_large = False
+        self.waiting = 0
+        self.closed = False
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("DOWNLOAD_ORDER", "crawl"), config.get("COURSE_PRIORITIES", []), config["DOWNLOAD_DIR"])
+
+    def course_name(self, file):
+        relative = os.path.relpath(file["path"], self.download_dir) if self.download_dir else file["path"]
+        return relative.split(os.sep, 1)[0]
+
+    def _key(self, file):
+        size = file.get("size", 0)
+        if self.policy == "smallest_first" or self.policy == "interleaved":
+            return (size,)
+        if self.policy == "priority_first":
+            return (course_priority(self.course_name(file), self.priorities), size)
+        return ()
+
+    def put(self, file):
+        seq = next(self.counter)
+        key = self._key(file)
+        with self.condition:
+            heapq.heappush(self.small, (key, seq, file))
+            if self.policy == "interleaved":
+                heapq.heappush(self.large, (tuple(-k for k in key), seq, file))
+            self.waiting += 1
+            self.condition.notify()
+
+    def __len__(self):
+        with self.condition:
+            return self.waiting
+
+    def _pop(self):
+        self.waiting -= 1
+        if self.policy != "interleaved":
+            return heapq.heappop(self.small)[2]
+        # Both heaps hold every file; skip entries already handed out from the other one
+        heap = self.large if self.take_large else self.small
+        other = self.small if self.take_large else self.large
+        self.take_large = not self.take_large
+        while True:
+            _, seq, file = heapq.heappop(heap)
+            if seq in self.taken:
+                self.taken.discard(seq)
+                continue
+            self.taken.add(seq)
+            # Drop the twin entry eagerly when it sits on top of the other heap
+            while other and other[0][1] in self.taken:
+                self.taken.discard(heapq.heappop(other)[1])
+            return file
+
+    def get(self):
+        """Next file in policy order, blocking until one arrives; None once closed and empty."""
+        with self.condition:
+            while not self.waiting:
+                if self.closed:
+                    return None
+                self.condition.wait()
+            return self._pop()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def clear(self):
+        """Drop everything still waiting."""
+        with self.condition:
+            self.small.clear()
+            self.large.clear()
+            self.taken.clear()
+            self.waiting = 0
+
+    def __iter__(self):
+        return iter(self.get, None)
+
+class BandwidthLimiter:
+    """Shared token bucket capping the combined download rate of every worker.
+
+    Workers report bytes through consume(), which sleeps off any excess. The
+    rate comes from `rate_source()`, re-read at most once per
+    `refresh_every` seconds, so the cap can change while downloads run.
+    """
+
+    def __init__(self, rate_source, refresh_every=1.0):
+        self.rate_source = rate_source
+        self.refresh_every = refresh_every
+        self.lock = threading.Lock()
+        self.rate = 0.0
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.refreshed = None
+
+    @classmethod
+    def from_config(cls, config):
+        def current_rate():
+            if isinstance(config, Config):
+                try:
+                    reload_config(config.path)
+                except (OSError, ValueError) as e:
+                    # A config.json caught mid-edit must not fail the download reporting progress
+                    logger.info(f"Keeping the previous bandwidth cap: {e}")
+            return scheduled_rate(config)
+        return cls(current_rate)
+
+    def consume(self, nbytes):
+        now = time.monotonic()
+        with self.lock:
+            if self.refreshed is None or now - self.refreshed >= self.refresh_every:
+                self.refreshed = now
+                rate = float(self.rate_source() or 0)
+                if rate != self.rate:
+                    if rate:
+                        logger.info(f"Download bandwidth capped at {rate/1024/1024:.2f} MB/s")
+                    self.rate = rate
+                    self.tokens = min(self.tokens, rate)
+            if not self.rate:
+                self.updated = now
+                return
+            # Allow up to one second of burst; a deficit is slept off by whoever caused it
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate) - nbytes
+            self.updated = now
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+def _minutes(hhmm):
+    hours, _, minutes = hhmm.partition(":")
+    return int(hours) * 60 + int(minutes or 0)
+
+def scheduled_rate(config, now=None):
+    """MAX_BYTES_PER_SECOND, or the bytes_per_second of the BANDWIDTH_SCHEDULE window covering the local time."""
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    for window in config.get("BANDWIDTH_SCHEDULE") or []:
+        start, end = _minutes(window["start"]), _minutes(window["end"])
+        # Windows may wrap past midnight, e.g. 22:00-06:00
+        inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+        if inside:
+            return window.get("bytes_per_second", 0)
+    return config.get("MAX_BYTES_PER_SECOND", 0)
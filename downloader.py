@@ -1,46 +1,252 @@
 # downloader.py
 import os
+import time
+import threading
 import requests
-from tqdm import tqdm
 from config import load_config
+from manifest import get_manifest
+from metrics import get_metrics
+from logger import error_extra
 import logging
 
 logger = logging.getLogger(__name__)
 
-def download_file(session, url, save_path, download_log):
-    config = load_config()
-    save_path_abs = os.path.abspath(save_path)
+PART_SUFFIX = ".part"
+MIN_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_CHUNK_SIZE = 4 * 1024 * 1024
+PROGRESS_INTERVAL = 0.1
+FALLOC_FL_KEEP_SIZE = 0x01
 
-    if save_path_abs in download_log:
+_buffers = threading.local()
+
+def is_download_complete(path, expected_size=0, manifest=None):
+    """True if `path` exists and, when the size is known, has exactly that many bytes.
+
+    Answered from `manifest` when one is given instead of stat-ing the file.
+    """
+    if manifest is not None:
+        return manifest.is_complete(path, expected_size)
+    try:
+        actual_size = os.path.getsize(path)
+    except OSError:
+        return False
+    return not expected_size or actual_size == expected_size
+
+def _content_range_total(r):
+    """Total length from a 'Content-Range: bytes start-end/total' header, or 0."""
+    total = r.headers.get('content-range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else 0
+
+def _read_buffer(size):
+    """This thread's reusable read buffer, replaced by a bigger one if it is under `size` bytes."""
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None or len(buffer) < size:
+        buffer = _buffers.buffer = bytearray(size)
+    return memoryview(buffer)
+
+def _iter_body(r, max_chunk):
+    """Yield the response body in memoryviews over a per-thread buffer that is reused for every chunk.
+
+    Identity-encoded bodies are read with readinto() straight from the
+    underlying http.client response, so no bytes object is created per
+    chunk. The read size starts at MIN_CHUNK_SIZE and doubles while a chunk
+    (read, write and progress) takes under 50ms, up to `max_chunk`; it
+    halves again when a chunk takes over half a second, so slow or capped
+    transfers still report progress. Compressed bodies use iter_content().
+    """
+    fp = getattr(r.raw, "_fp", None)
+    if r.headers.get("content-encoding", "identity").lower() != "identity" or not hasattr(fp, "readinto"):
+        for chunk in r.iter_content(chunk_size=max_chunk):
+            yield memoryview(chunk)
+        return
+    view = _read_buffer(max_chunk)
+    size = min(MIN_CHUNK_SIZE, max_chunk)
+    while True:
+        started = time.perf_counter()
+        n = fp.readinto(view[:size])
+        if not n:
+            break
+        yield view[:n]
+        elapsed = time.perf_counter() - started
+        if n == size and elapsed < 0.05:
+            size = min(size * 2, max_chunk)
+        elif elapsed > 0.5:
+            size = max(size // 2, MIN_CHUNK_SIZE)
+    # http.client closes itself at the end of the body; hand the connection back to the pool
+    r.raw.release_conn()
+
+def _write_all(f, data):
+    while data:
+        data = data[f.write(data):]
+
+def _load_fallocate():
+    """libc's fallocate(2), or None where it isn't available (non-Linux)."""
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        fallocate = libc.fallocate
+    except (ImportError, OSError, AttributeError):
+        return None
+    fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+    fallocate.restype = ctypes.c_int
+    return fallocate
+
+_fallocate = _load_fallocate()
+
+def _preallocate(f, offset, length):
+    """Reserve `length` bytes from `offset` so the file isn't grown write by write. Best effort.
+
+    Uses FALLOC_FL_KEEP_SIZE, so the file's visible size stays at the bytes
+    actually written and a .part left by a killed process can still be
+    resumed from its length. posix_fallocate() is not used: it extends the
+    size and would make every interrupted .part look complete.
+    """
+    if length <= 0 or _fallocate is None:
+        return False
+    return _fallocate(f.fileno(), FALLOC_FL_KEEP_SIZE, offset, length) == 0
+
+def download_file(session, url, save_path, download_log, progress=None, expected_size=0, manifest=None, config=None):
+    """Stream `url` to `save_path`.
+
+    Data goes to `save_path + ".part"` and is renamed into place only once its
+    length matches the server's content-length (or `expected_size`). An
+    existing .part file is resumed with a Range request when the server
+    honours it. Progress is shown on a per-file bar unless a
+    `progress(nbytes)` callback is given, in which case the caller aggregates
+    it (see DownloadManager). File existence and sizes come from the
+    DOWNLOAD_DIR manifest rather than per-file stat calls.
+
+    The body is read in adaptive chunks of up to DOWNLOAD_CHUNK_SIZE bytes
+    into a reused buffer and written unbuffered. When the length is known
+    the .part file's blocks are reserved up front (DOWNLOAD_PREALLOCATE)
+    without changing its size, and any unused reservation is released when
+    the transfer ends. Progress is reported at most every PROGRESS_INTERVAL
+    seconds.
+    """
+    config = config or load_config()
+    if manifest is None:
+        manifest = get_manifest(config["DOWNLOAD_DIR"])
+    save_path_abs = manifest.abspath(save_path)
+
+    if save_path_abs in download_log and manifest.is_complete(save_path, expected_size):
         return
 
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    if os.path.exists(save_path):
+    manifest.ensure_dir(os.path.dirname(save_path))
+    if manifest.is_complete(save_path, expected_size):
         download_log[save_path_abs] = True
         return
 
-    headers = {'User-Agent': 'Mozilla/5.0'}
+    part_path = save_path + PART_SUFFIX
+    part_entry = manifest.stat(part_path)
+    offset = part_entry[0] if part_entry else 0
+    if expected_size and offset > expected_size:
+        offset = 0
+
+    # Ask for the bytes as stored: content-length and Range offsets then count
+    # the same bytes that are written to the .part file
+    headers = {'User-Agent': 'Mozilla/5.0', 'Accept-Encoding': 'identity'}
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+    metrics = get_metrics()
+    start = time.perf_counter()
+    write_seconds = 0.0
     try:
         with session.get(url, stream=True, headers=headers, timeout=15) as r:
+            if offset and r.status_code == 416:
+                # Our offset is past the end; the .part is stale, so start over
+                os.remove(part_path)
+                manifest.record(part_path)
+                return download_file(session, url, save_path, download_log, progress, expected_size, manifest, config)
             r.raise_for_status()
-            total = int(r.headers.get('content-length', 0))
-            with open(save_path, 'wb') as f, tqdm(
+
+            length = int(r.headers.get('content-length', 0))
+            encoded = r.headers.get('content-encoding', 'identity').lower() != 'identity'
+            if encoded:
+                # The server compressed the body anyway. Its lengths count encoded
+                # bytes, so they are checked against the raw bytes read below, and
+                # a partial encoded body can't be appended to the decoded .part
+                if r.status_code == 206:
+                    os.remove(part_path)
+                    manifest.record(part_path)
+                    raise IOError("Server sent a compressed partial body; restarting from scratch next time")
+                mode = 'wb'
+                offset = 0
+                total = 0
+            elif offset and r.status_code == 206:
+                mode = 'r+b'
+                total = _content_range_total(r) or (offset + length if length else 0)
+            else:
+                # Server ignored the Range header and is sending the whole file
+                mode = 'wb'
+                offset = 0
+                total = length
+            if offset:
+                logger.info(f"Resuming {os.path.basename(save_path)} at {offset} bytes")
+
+            from tqdm import tqdm
+            max_chunk = int(config.get("DOWNLOAD_CHUNK_SIZE", DEFAULT_MAX_CHUNK_SIZE))
+            with open(part_path, mode, buffering=0) as f, tqdm(
                 desc=os.path.basename(save_path),
                 total=total,
+                initial=offset,
                 unit='B',
                 unit_scale=True,
-                leave=False
+                leave=False,
+                disable=progress is not None
             ) as bar:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-                    bar.update(len(chunk))
-            download_log[save_path_abs] = True
+                def report(nbytes):
+                    metrics.incr("download_bytes_total", nbytes)
+                    if progress:
+                        progress(nbytes)
+                    else:
+                        bar.update(nbytes)
+
+                f.seek(offset)
+                preallocated = config.get("DOWNLOAD_PREALLOCATE", True) and _preallocate(f, offset, total - offset)
+                unreported = 0
+                reported_at = time.perf_counter()
+                try:
+                    for chunk in _iter_body(r, max_chunk):
+                        write_start = time.perf_counter()
+                        _write_all(f, chunk)
+                        write_seconds += time.perf_counter() - write_start
+                        unreported += len(chunk)
+                        if write_start - reported_at >= PROGRESS_INTERVAL:
+                            report(unreported)
+                            unreported = 0
+                            reported_at = write_start
+                finally:
+                    if preallocated:
+                        f.truncate(f.tell())
+                    if unreported:
+                        report(unreported)
+            if encoded and length and r.raw.tell() != length:
+                manifest.record(part_path)
+                raise IOError(f"Incomplete download: got {r.raw.tell()} of {length} compressed bytes")
+
+        expected = total or (0 if encoded else expected_size)
+        actual = os.path.getsize(part_path)
+        if expected and actual != expected:
+            if actual > expected:
+                os.remove(part_path)
+            manifest.record(part_path)
+            raise IOError(f"Incomplete download: got {actual} of {expected} bytes")
+        os.replace(part_path, save_path)
+        manifest.record(part_path)
+        manifest.record(save_path)
+        download_log[save_path_abs] = True
+        metrics.observe("download", time.perf_counter() - start)
+        metrics.observe("download_write", write_seconds)
+        metrics.incr("downloads_total", result="ok")
     except requests.HTTPError as e:
+        metrics.incr("downloads_total", result="failed")
         if e.response.status_code == 400:
             logger.debug(f"Skipping download (400 error): {os.path.basename(save_path)}")
         else:
-            logger.info(f"Error downloading {os.path.basename(save_path)}: {e}")
+            logger.info(f"Error downloading {os.path.basename(save_path)}: {e}", extra=error_extra(e))
         raise
     except Exception as e:
-        logger.info(f"Error downloading {os.path.basename(save_path)}: {e}")
+        metrics.incr("downloads_total", result="failed")
+        logger.info(f"Error downloading {os.path.basename(save_path)}: {e}", extra=error_extra(e))
         raise
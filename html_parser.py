@@ -0,0 +1,45 @@
+# html_parser.py
+import re
+import importlib.util
+from functools import lru_cache
+from config import load_config
+
+def _has_class(name):
+    # Strainers see the raw class attribute, so match one class within a space-separated list
+    return re.compile(rf"(^|\s){re.escape(name)}(\s|$)")
+
+# Only the parts of each page the scraper reads are built into a tree.
+# Callers pass these names; the SoupStrainers are built on first use so
+# importing the scraper doesn't import bs4.
+COURSE_ROWS = "course_rows"
+MODULES = "modules"
+LINKS = "links"
+
+_STRAINER_ARGS = {
+    COURSE_ROWS: ("tr", {"class_": _has_class("course-list-table-row")}),
+    MODULES: ("div", {"class_": _has_class("context_module")}),
+    LINKS: ("a", {"href": True}),
+}
+
+@lru_cache(maxsize=None)
+def get_strainer(name):
+    from bs4 import SoupStrainer
+    tag, attrs = _STRAINER_ARGS[name]
+    return SoupStrainer(tag, **attrs)
+
+_parser_name = None
+
+def get_parser_name():
+    """Resolve HTML_PARSER: "auto" picks lxml when it's installed, else the stdlib html.parser."""
+    global _parser_name
+    if _parser_name is None:
+        choice = load_config().get("HTML_PARSER", "auto")
+        if choice == "auto":
+            choice = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+        _parser_name = choice
+    return _parser_name
+
+def make_soup(html, parse_only=None):
+    """Parse `html` with the configured backend, optionally restricted to one of the named strainers."""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, get_parser_name(), parse_only=get_strainer(parse_only) if parse_only else None)
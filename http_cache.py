@@ -0,0 +1,130 @@
+# http_cache.py
+import os
+import json
+import time
+import threading
+import logging
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Persistent URL-keyed cache of HTTP validators and parsed results.
+
+    Each entry keeps the ETag / Last-Modified of the last 200 response, the
+    final URL after redirects and whatever the caller parsed out of it. While
+    an entry is younger than `ttl` the request is skipped entirely; after that
+    the caller sends a conditional request and reuses the stored result on 304.
+    """
+
+    def __init__(self, path, ttl=86400, max_age=30 * 86400, max_entries=50000):
+        self.path = path
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.fresh_hits = 0
+        self.not_modified = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Create and load the cache described by config, or None if it is disabled."""
+        if not config.get("HTTP_CACHE", True):
+            return None
+        cache = cls(
+            config.get("HTTP_CACHE_FILE", "data/http_cache.json"),
+            ttl=config.get("HTTP_CACHE_TTL", 86400),
+            max_age=config.get("HTTP_CACHE_MAX_AGE", 30 * 86400),
+            max_entries=config.get("HTTP_CACHE_MAX_ENTRIES", 50000)
+        )
+        cache.load()
+        return cache
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logger.info(f"Failed to load HTTP cache: {e}")
+                self.entries = {}
+        self.evict()
+
+    def save(self):
+        self.evict()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self.lock:
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def evict(self):
+        """Drop entries not validated within max_age, then the oldest beyond max_entries."""
+        cutoff = time.time() - self.max_age
+        with self.lock:
+            self.entries = {url: e for url, e in self.entries.items() if e["validated_at"] >= cutoff}
+            if len(self.entries) > self.max_entries:
+                newest = sorted(self.entries.items(), key=lambda kv: kv[1]["validated_at"], reverse=True)
+                self.entries = dict(newest[:self.max_entries])
+
+    def fresh_result(self, url):
+        """Return the stored result if the entry is still within its TTL, else None."""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry and time.time() - entry["validated_at"] < self.ttl:
+                self.fresh_hits += 1
+                get_metrics().incr("http_cache_lookups_total", result="fresh")
+                return entry["result"]
+        return None
+
+    def final_url(self, url):
+        """URL the last stored response for `url` was redirected to, or None if there is no entry."""
+        with self.lock:
+            entry = self.entries.get(url)
+        return entry["final_url"] if entry else None
+
+    def stored_result(self, url):
+        """The stored result for `url` regardless of its age, or None if there is no entry."""
+        with self.lock:
+            entry = self.entries.get(url)
+        return entry["result"] if entry else None
+
+    def conditional_headers(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def revalidated(self, url):
+        """Mark an entry as confirmed by a 304 and return its stored result."""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return None
+            entry["validated_at"] = time.time()
+            self.not_modified += 1
+            get_metrics().incr("http_cache_lookups_total", result="not_modified")
+            return entry["result"]
+
+    def store(self, url, response, result):
+        """Record the validators of a 200 response together with its parsed result."""
+        now = time.time()
+        with self.lock:
+            self.misses += 1
+            get_metrics().incr("http_cache_lookups_total", result="miss")
+            self.entries[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "final_url": response.url,
+                "result": result,
+                "stored_at": now,
+                "validated_at": now
+            }
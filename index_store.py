@@ -0,0 +1,189 @@
+# index_store.py
+import os
+import json
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS courses (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS modules (
+    id INTEGER PRIMARY KEY,
+    course_id TEXT NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    module_id INTEGER NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    downloaded INTEGER NOT NULL DEFAULT 0,
+    path TEXT NOT NULL,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS download_log (
+    path TEXT PRIMARY KEY
+);
+CREATE INDEX IF NOT EXISTS idx_modules_course ON modules(course_id, position);
+CREATE INDEX IF NOT EXISTS idx_files_module ON files(module_id, position);
+CREATE INDEX IF NOT EXISTS idx_files_path ON files(path);
+CREATE INDEX IF NOT EXISTS idx_files_url ON files(url);
+CREATE INDEX IF NOT EXISTS idx_files_downloaded ON files(downloaded);
+"""
+
+COURSE_COLUMNS = ("id", "name")
+MODULE_COLUMNS = ("name",)
+FILE_COLUMNS = ("name", "url", "size", "downloaded", "path")
+
+def _split(record, columns, children=None):
+    """Split a record into its column values and a JSON blob of any other keys."""
+    extra = {k: v for k, v in record.items() if k not in columns and k != children}
+    return [record.get(c) for c in columns], json.dumps(extra)
+
+class SQLiteIndexStore:
+    """Index backend storing courses, modules and files as SQLite rows.
+
+    The nested dict returned by `load` has the same shape as the JSON index, so
+    callers can switch backends without changes. Unlike the JSON file, a single
+    file's downloaded state can be committed on its own with `mark_downloaded`,
+    and a single re-indexed course with `save_course`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def is_empty(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM courses").fetchone()[0] == 0 and \
+                self.conn.execute("SELECT COUNT(*) FROM meta").fetchone()[0] == 0
+
+    def save(self, data):
+        """Replace the stored index with `data` in a single transaction."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM files")
+            self.conn.execute("DELETE FROM modules")
+            self.conn.execute("DELETE FROM courses")
+            self.conn.execute("DELETE FROM download_log")
+            self._write_meta(data)
+            self.conn.executemany("INSERT INTO download_log (path) VALUES (?)",
+                                  [(p,) for p in data.get("download_log", {})])
+            for c_pos, course in enumerate(data["courses"]):
+                self._insert_course(course, c_pos)
+
+    def save_course(self, data, course_id):
+        """Replace the rows of one course of `data` and the index totals in a single transaction.
+
+        Other courses and the download log (kept current by mark_downloaded)
+        are left as stored, so saving after each indexed course doesn't
+        rewrite the whole index.
+        """
+        position, course = next((i, c) for i, c in enumerate(data["courses"]) if str(c["id"]) == str(course_id))
+        with self.lock, self.conn:
+            # Cascades to the course's modules and files
+            self.conn.execute("DELETE FROM courses WHERE id = ?", (str(course_id),))
+            self._insert_course(course, position)
+            self._write_meta(data)
+
+    def _write_meta(self, data):
+        meta = {k: v for k, v in data.items() if k not in ("courses", "download_log")}
+        self.conn.execute("DELETE FROM meta")
+        self.conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                              [(k, json.dumps(v)) for k, v in meta.items()])
+
+    def _insert_course(self, course, c_pos):
+        (course_id, name), extra = _split(course, COURSE_COLUMNS, "modules")
+        self.conn.execute("INSERT INTO courses (id, position, name, extra) VALUES (?, ?, ?, ?)",
+                          (str(course_id), c_pos, name, extra))
+        for m_pos, module in enumerate(course["modules"]):
+            (name,), extra = _split(module, MODULE_COLUMNS, "files")
+            module_id = self.conn.execute(
+                "INSERT INTO modules (course_id, position, name, extra) VALUES (?, ?, ?, ?)",
+                (str(course_id), m_pos, name, extra)).lastrowid
+            self.conn.executemany(
+                "INSERT INTO files (module_id, position, name, url, size, downloaded, path, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(module_id, f_pos, *values[:3], int(bool(values[3])), values[4], extra)
+                 for f_pos, (values, extra) in enumerate(_split(f, FILE_COLUMNS) for f in module["files"])])
+
+    def load(self):
+        """Rebuild the nested index dict, or return None if nothing has been stored yet."""
+        with self.lock:
+            meta = self.conn.execute("SELECT key, value FROM meta").fetchall()
+            courses = self.conn.execute("SELECT id, name, extra FROM courses ORDER BY position").fetchall()
+            modules = self.conn.execute("SELECT id, course_id, name, extra FROM modules ORDER BY course_id, position").fetchall()
+            files = self.conn.execute(
+                "SELECT module_id, name, url, size, downloaded, path, extra FROM files ORDER BY module_id, position").fetchall()
+            log = self.conn.execute("SELECT path FROM download_log").fetchall()
+        if not meta and not courses:
+            return None
+
+        files_by_module = {}
+        for module_id, name, url, size, downloaded, path, extra in files:
+            record = {"name": name, "url": url, "size": size, "downloaded": bool(downloaded), "path": path}
+            record.update(json.loads(extra))
+            files_by_module.setdefault(module_id, []).append(record)
+
+        modules_by_course = {}
+        for module_id, course_id, name, extra in modules:
+            record = {"name": name}
+            record.update(json.loads(extra))
+            record["files"] = files_by_module.get(module_id, [])
+            modules_by_course.setdefault(course_id, []).append(record)
+
+        data = {k: json.loads(v) for k, v in meta}
+        data["courses"] = []
+        for course_id, name, extra in courses:
+            record = {"name": name, "id": course_id}
+            record.update(json.loads(extra))
+            record["modules"] = modules_by_course.get(course_id, [])
+            data["courses"].append(record)
+        data["download_log"] = {path: True for (path,) in log}
+        return data
+
+    def mark_downloaded(self, path, downloaded=True, size=None):
+        """Commit one file's downloaded state, its download log entry and, if given, its real size."""
+        abs_path = os.path.abspath(path)
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE files SET downloaded = ? WHERE path = ?", (int(downloaded), path))
+            if size is not None:
+                self.conn.execute("UPDATE files SET size = ?, extra = json_set(extra, '$.size_exact', json('true')) "
+                                  "WHERE path = ?", (size, path))
+            if downloaded:
+                self.conn.execute("INSERT OR IGNORE INTO download_log (path) VALUES (?)", (abs_path,))
+            else:
+                self.conn.execute("DELETE FROM download_log WHERE path = ?", (abs_path,))
+
+    def migrate_from_json(self, json_path):
+        """Import an existing JSON index. Returns True if anything was imported."""
+        if not os.path.exists(json_path):
+            return False
+        with open(json_path, "r") as f:
+            data = json.load(f)
+        self.save(data)
+        logger.info(f"Migrated index from {json_path} to {self.path}")
+        return True
@@ -1,20 +1,57 @@
 # indexer.py
 import os
 import json
+import hashlib
 import requests
-from bs4 import BeautifulSoup
 from config import load_config
-from scraper import parse_courses, parse_modules_and_items, parse_file_download_link, is_downloadable_file, get_filename_from_url_or_text
+from scraper import parse_courses, parse_modules_and_items, parse_file_download_link, parse_wiki_page, parse_wiki_page_links
 import logging
 from spinner import Spinner
-from tqdm import tqdm
+from http_cache import ResponseCache
+from index_store import SQLiteIndexStore
+from downloader import is_download_complete
+from manifest import get_manifest
+from canvas_api import fetch_course_modules
+from metrics import get_metrics
+from logger import QUIET, error_extra
+from negative_cache import get_negative_cache, failure_status, response_status
+from page_export import get_page_exporter, is_wiki_page
 import sys
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 logger = logging.getLogger(__name__)
 
-def load_index_file():
+_index_stores = {}
+
+def get_index_store(config=None):
+    """Return the SQLite index store if INDEX_STORE is "sqlite", else None.
+
+    The first time a database is opened it is seeded from the existing JSON
+    DATA_FILE, so switching backends keeps the current index.
+    """
+    config = config or load_config()
+    if config.get("INDEX_STORE", "json") != "sqlite":
+        return None
+    db_file = config.get("INDEX_DB_FILE", "data/canvas_data.db")
+    store = _index_stores.get(db_file)
+    if store is None:
+        store = SQLiteIndexStore(db_file)
+        if store.is_empty():
+            store.migrate_from_json(config["DATA_FILE"])
+        _index_stores[db_file] = store
+    return store
+
+def load_index_file(config=None):
     """Load existing index file if it exists."""
-    config = load_config()
+    config = config or load_config()
+    store = get_index_store(config)
+    if store:
+        try:
+            return store.load()
+        except Exception as e:
+            logger.info(f"Failed to load index database: {e}")
+            return None
     index_file = config["DATA_FILE"]
     if os.path.exists(index_file):
         try:
@@ -24,30 +61,450 @@ def load_index_file():
             logger.info(f"Failed to load index file: {e}")
     return None
 
-def save_index_file(data):
+def save_index_file(data, config=None):
     """Save the index data to file."""
-    config = load_config()
+    with get_metrics().timer("index_save"):
+        _save_index_file(data, config or load_config())
+
+def _save_index_file(data, config):
+    store = get_index_store(config)
+    if store:
+        store.save(data)
+        if not config.get("INDEX_JSON_EXPORT", True):
+            return
     index_file = config["DATA_FILE"]
     os.makedirs(os.path.dirname(index_file) or '.', exist_ok=True)
     with open(index_file, "w") as f:
         json.dump(data, f, indent=2)
 
-def check_downloaded_files(data):
-    """Check which files in the index have already been downloaded."""
+def save_course_index(data, course_id, config=None):
+    """Save the index after one course of `data` was (re-)indexed.
+
+    The SQLite backend rewrites only that course's rows, and leaves the JSON
+    export to the next save_index_file(); the JSON backend has to rewrite
+    the whole file.
+    """
+    config = config or load_config()
+    with get_metrics().timer("index_save"):
+        store = get_index_store(config)
+        if store:
+            store.save_course(data, course_id)
+        else:
+            _save_index_file(data, config)
+
+def mark_file_downloaded(file, config=None):
+    """Persist a single file's downloaded state when the backend supports it. Returns True if it did."""
+    store = get_index_store(config)
+    if store:
+        store.mark_downloaded(file["path"], file["downloaded"], file.get("size") if file["downloaded"] else None)
+        return True
+    return False
+
+def check_downloaded_files(data, manifest=None, config=None):
+    """Check which files in the index have already been downloaded.
+
+    A file only counts if its size matches the indexed size (when known), so
+    files truncated by an interrupted run are fetched again. Answers come
+    from one scan of DOWNLOAD_DIR rather than a stat per file.
+    """
+    manifest = manifest or get_manifest((config or load_config())["DOWNLOAD_DIR"])
     for course in data["courses"]:
         for module in course["modules"]:
             for file in module["files"]:
-                if os.path.exists(file["path"]):
+                abs_path = manifest.abspath(file["path"])
+                if manifest.is_complete(file["path"], file.get("size", 0)):
                     file["downloaded"] = True
-                    data["download_log"][os.path.abspath(file["path"])] = True
+                    data["download_log"][abs_path] = True
+                elif file.get("downloaded") and manifest.stat(file["path"]) is not None:
+                    logger.info(f"Size mismatch, will re-download: {file['path']}")
+                    file["downloaded"] = False
+                    data["download_log"].pop(abs_path, None)
     return data
 
-def index_courses_and_files(session):
-    """Index all courses, modules, and files, including file sizes."""
-    config = load_config()
+def parse_item_links(page_html, redirected_url, base_url):
+    """Return [name, url, linked] for each file a fetched module item page points to.
+
+    A wiki page (redirected_url containing /pages/) yields every downloadable
+    link in its body, marked as linked. Other pages yield their download
+    link, or failing that the first downloadable anchor on the page.
+    """
+    if is_wiki_page(redirected_url):
+        page = parse_wiki_page(page_html)
+        if page is not None:
+            return [[file_name, url, True] for file_name, url in parse_wiki_page_links(page[1], base_url)]
+    file_name, download_url = parse_file_download_link(page_html, base_url)
+    if file_name and download_url:
+        return [[file_name, download_url, False]]
+    return []
+
+def _predates_wiki_links(cache, url):
+    """True if `url` is a wiki page cached when only its first file link was indexed (stored as unlinked)."""
+    final_url = cache.final_url(url)
+    if not final_url or not is_wiki_page(final_url):
+        return False
+    return any(not linked for _, _, linked in cache.stored_result(url) or [])
+
+def fetch_item_links(session, item, base_url, cache=None, negative=None, pages=None, module_dir=None):
+    """Fetch a module item page and return [name, url, linked] for each file it points to.
+
+    Items that failed recently according to the `negative` cache are skipped
+    and return None. Wiki pages are handed to the `pages` exporter to be
+    saved in `module_dir`; a cached wiki page without a current export is
+    fetched in full instead of being answered from the cache.
+    """
+    url = item['url']
+    if negative and negative.should_skip(url):
+        return None
+    if cache and pages and pages.needs_fetch(url, cache.final_url(url)):
+        cache = None
+    if cache and (isinstance(cache.stored_result(url), dict) or _predates_wiki_links(cache, url)):
+        # A dict is a HEAD result older versions stored under the page URL; old wiki results lack linked files
+        cache = None
+    headers = {'Accept-Encoding': 'identity'}
+    if cache:
+        cached = cache.fresh_result(url)
+        if cached is not None:
+            return cached
+        headers.update(cache.conditional_headers(url))
+
+    metrics = get_metrics()
+    try:
+        with metrics.timer("item_fetch"):
+            item_page = session.get(url, allow_redirects=True, stream=True, headers=headers)
+            if cache and item_page.status_code == 304:
+                cached = cache.revalidated(url)
+                if cached is not None:
+                    return cached
+                # Entry was evicted between the lookup and the response; fetch it in full
+                item_page = session.get(url, allow_redirects=True, stream=True)
+            item_page.raise_for_status()
+            page_html = item_page.text
+    except requests.RequestException as e:
+        if negative:
+            negative.record_failure(url, failure_status(e))
+        raise
+    if negative:
+        negative.record_success(url)
+
+    with metrics.timer("item_parse"):
+        links = parse_item_links(page_html, item_page.url, base_url)
+    if pages and is_wiki_page(item_page.url):
+        pages.export(item, page_html, module_dir, {link_url: name for name, link_url, _ in links})
+    if cache:
+        cache.store(url, item_page, links)
+    return links
+
+def get_file_size(session, url, cache=None, negative=None):
+    """HEAD a file URL for its content-length, answering from the cache when possible.
+
+    Returns 0 (unknown) without a request if the HEAD failed recently, and
+    for failed or compressed responses, whose content-length isn't the
+    file's size. HEAD results and failures are kept under "HEAD <url>",
+    apart from the URL itself: a failed HEAD never stops the download from
+    being attempted, and a size never stands in for the page at the same URL.
+    """
+    key = f"HEAD {url}"
+    if negative and negative.should_skip(key):
+        return 0
+    headers = {'Accept-Encoding': 'identity'}
+    if cache:
+        cached = cache.fresh_result(key)
+        if cached is not None:
+            return cached["size"]
+        headers.update(cache.conditional_headers(key))
+
+    try:
+        with get_metrics().timer("head"):
+            head = session.head(url, allow_redirects=True, headers=headers)
+            if cache and head.status_code == 304:
+                cached = cache.revalidated(key)
+                if cached is not None:
+                    return cached["size"]
+                head = session.head(url, allow_redirects=True, headers={'Accept-Encoding': 'identity'})
+    except requests.RequestException as e:
+        if negative:
+            negative.record_failure(key, failure_status(e))
+        raise
+    if negative:
+        if head.ok:
+            negative.record_success(key)
+        else:
+            negative.record_failure(key, response_status(head))
+
+    if not head.ok:
+        return 0
+    encoded = head.headers.get('content-encoding', 'identity').lower() != 'identity'
+    file_size = 0 if encoded else int(head.headers.get('content-length', 0))
+    if cache:
+        cache.store(key, head, {"size": file_size})
+    return file_size
+
+def make_file_record(config, course_name, module_name, file_name, url, file_size, item_url=None):
+    path = os.path.join(config['DOWNLOAD_DIR'], course_name, module_name, file_name)
+    return {
+        "name": file_name,
+        "url": url,
+        "size": file_size,
+        "downloaded": is_download_complete(path, file_size, get_manifest(config['DOWNLOAD_DIR'])),
+        "path": path,
+        "item_url": item_url
+    }
+
+def probe_file(session, config, course_name, module_name, file_name, url, linked=False, cache=None, item_url=None):
+    """HEAD a file URL and build its index record."""
+    try:
+        file_size = get_file_size(session, url, cache, get_negative_cache(config))
+        if linked:
+            logger.info(f"Found linked file: {file_name} ({file_size} bytes)", extra=QUIET)
+        else:
+            logger.info(f"Found file: {file_name} ({file_size} bytes)", extra=QUIET)
+    except Exception as e:
+        logger.info(f"Could not get file size for {file_name}: {e}", extra=error_extra(e))
+        file_size = 0
+    return make_file_record(config, course_name, module_name, file_name, url, file_size, item_url)
+
+def crawl_items(session, executor, config, course_name, jobs, file_pbar, cache=None, on_file=None):
+    """Crawl (module_name, item) jobs on the executor and return their file lists in job order.
+
+    Item pages are fetched first; as each one completes its HEAD probes are queued,
+    and the file progress bar advances once all probes for an item have finished.
+    `on_file(record)` is called from this thread as soon as each record is built.
+    Items whose page could not be fetched, or was skipped as recently failed,
+    are left as None so the caller can retry them.
+    """
+    results = [None for _ in jobs]
+    probes_left = {}
+    pending = {}
+
+    negative = get_negative_cache(config)
+    pages = get_page_exporter(config)
+    for j, (module_name, item) in enumerate(jobs):
+        module_dir = os.path.join(config['DOWNLOAD_DIR'], course_name, module_name)
+        future = executor.submit(fetch_item_links, session, item, config['BASE_URL'], cache, negative, pages, module_dir)
+        pending[future] = (j, None)
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            j, slot = pending.pop(future)
+            if slot is not None:
+                results[j][slot] = future.result()
+                if on_file:
+                    on_file(results[j][slot])
+                probes_left[j] -= 1
+                if probes_left[j] == 0:
+                    file_pbar.update(1)
+                continue
+
+            try:
+                links = future.result()
+            except Exception as e:
+                logger.info(f"Failed to fetch module item page: {e}", extra=error_extra(e))
+                links = None
+            if not links:
+                if links is not None:
+                    results[j] = []
+                file_pbar.update(1)
+                continue
+
+            results[j] = [None] * len(links)
+            probes_left[j] = len(links)
+            module_name, item = jobs[j]
+            for slot, (file_name, url, linked) in enumerate(links):
+                future = executor.submit(probe_file, session, config, course_name, module_name, file_name, url, linked, cache, item['url'])
+                pending[future] = (j, slot)
+
+    return results
+
+def fingerprint(value):
+    """Stable hash of a parsed module/item structure."""
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
+def index_course(session, executor, config, course, cache=None, previous=None, on_file=None):
+    """Index one course, re-crawling only what changed since `previous`.
+
+    Returns the course record, or `previous` (possibly None) if the modules page
+    could not be fetched. Without a previous record every item is crawled.
+    `on_file` is called for every file record, whether crawled or carried over.
+    """
+    course_name = course['name']
+
+    # Spinner for current course
+    spinner = Spinner(f"Fetching {course_name}")
+    spinner.start()
+    modules, api_files = None, {}
+    metrics = get_metrics()
+    try:
+        if config.get("INDEX_SOURCE", "html") == "api":
+            try:
+                with metrics.timer("modules_fetch"):
+                    modules, api_files = fetch_course_modules(session, config['BASE_URL'], course['id'])
+            except Exception as e:
+                logger.info(f"API indexing failed for {course_name}, falling back to the modules page: {e}", extra=error_extra(e))
+        if modules is None:
+            modules_url = f"{config['BASE_URL']}/courses/{course['id']}/modules"
+            negative = get_negative_cache(config)
+            if negative and negative.should_skip(modules_url):
+                logger.info(f"Skipping modules page of {course_name}, it failed recently")
+                return previous
+            try:
+                with metrics.timer("modules_fetch"):
+                    response = session.get(modules_url)
+                    response.raise_for_status()
+                    modules_html = response.text
+            except requests.RequestException as e:
+                if negative:
+                    negative.record_failure(modules_url, failure_status(e))
+                raise
+            if negative:
+                negative.record_success(modules_url)
+            with metrics.timer("modules_parse"):
+                modules = parse_modules_and_items(modules_html, course['id'], config['BASE_URL'])
+    except Exception as e:
+        logger.info(f"Failed to fetch modules page: {e}", extra=error_extra(e))
+        return previous
+    finally:
+        spinner.stop()
+
+    course_fingerprint = fingerprint(modules)
+    if previous and previous.get("fingerprint") == course_fingerprint and previous["name"] == course_name:
+        logger.info(f"Course unchanged: {course_name}", extra=QUIET)
+        if on_file:
+            for module in previous["modules"]:
+                for file in module["files"]:
+                    on_file(file)
+        return previous
+
+    from tqdm import tqdm
+
+    # Print course name with tqdm.write
+    tqdm.write(f"  {course_name}")
+
+    # A module whose fingerprint is unchanged is reused whole; in changed
+    # modules, files already indexed for each (module, item) pair carry over,
+    # except for items that could not be crawled last time
+    previous_modules = {m["name"]: m for m in previous["modules"]} if previous else {}
+    module_fingerprints = [fingerprint(module) for module in modules]
+    unchanged = {}
+    carried = {}
+    for position, module in enumerate(modules):
+        prev_module = previous_modules.get(module['name'])
+        if not prev_module or "items" not in prev_module:
+            continue
+        if prev_module.get("fingerprint") == module_fingerprints[position]:
+            unchanged[position] = prev_module
+            continue
+        for item in prev_module["items"]:
+            if item['url'] in prev_module.get("incomplete", []):
+                continue
+            carried[(module['name'], item['url'])] = [f for f in prev_module["files"] if f.get("item_url") == item['url']]
+
+    # Items the API already resolved need no page fetch or HEAD probe
+    jobs = []
+    for position, module in enumerate(modules):
+        if position in unchanged:
+            logger.info(f"Module unchanged: {module['name']}", extra=QUIET)
+            if on_file:
+                for file in unchanged[position]["files"]:
+                    on_file(file)
+            continue
+        logger.info(f"Indexing module: {module['name']}", extra=QUIET)
+        for item in module['items']:
+            key = (module['name'], item['url'])
+            if key not in carried and item['url'] in api_files:
+                carried[key] = []
+                for file_name, url, file_size, updated_at in api_files[item['url']]:
+                    record = make_file_record(config, course_name, module['name'], file_name, url, file_size, item['url'])
+                    record["updated_at"] = updated_at
+                    record["size_exact"] = bool(file_size)
+                    carried[key].append(record)
+                    logger.info(f"Found file: {file_name} ({file_size} bytes)", extra=QUIET)
+            if key not in carried:
+                jobs.append((module['name'], item))
+            elif on_file:
+                for file in carried[key]:
+                    on_file(file)
+
+    # Nested progress bar for files in this course
+    with tqdm(total=len(jobs), unit="file", desc="Files", position=1, leave=False, file=sys.stdout) as file_pbar:
+        crawled = crawl_items(session, executor, config, course_name, jobs, file_pbar, cache, on_file)
+    crawled = {(module_name, item['url']): files for (module_name, item), files in zip(jobs, crawled)}
+
+    course_data = {"name": course_name, "id": course['id'], "fingerprint": course_fingerprint, "modules": []}
+    for position, module in enumerate(modules):
+        if position in unchanged:
+            course_data["modules"].append(unchanged[position])
+            continue
+        files = []
+        incomplete = []
+        for item in module['items']:
+            key = (module['name'], item['url'])
+            item_files = carried[key] if key in carried else crawled[key]
+            if item_files is None:
+                incomplete.append(item['url'])
+                continue
+            files.extend(item_files)
+        module_data = {
+            "name": module['name'],
+            # An incomplete module gets no fingerprint, so the next run re-crawls its missing items
+            "fingerprint": None if incomplete else module_fingerprints[position],
+            "items": module['items'],
+            "files": files
+        }
+        if incomplete:
+            logger.info(f"{len(incomplete)} items in {module['name']} could not be crawled, will retry next run", extra=QUIET)
+            module_data["incomplete"] = incomplete
+            course_data["fingerprint"] = None
+        course_data["modules"].append(module_data)
+    course_data["total_modules"] = len(course_data["modules"])
+    course_data["total_files"] = sum(len(m["files"]) for m in course_data["modules"])
+    course_data["total_size"] = sum(f["size"] for m in course_data["modules"] for f in m["files"])
+    return course_data
+
+def iter_files(data):
+    """Yield every file record in the index."""
+    for course in data["courses"]:
+        for module in course["modules"]:
+            yield from module["files"]
+
+def update_totals(data):
+    data["total_courses"] = len(data["courses"])
+    data["total_files"] = sum(c["total_files"] for c in data["courses"])
+    data["total_size"] = sum(c["total_size"] for c in data["courses"])
+    return data
+
+def fetch_courses(session, config):
+    """Fetch and parse the course list.
+
+    Raises instead of returning an empty list when the request fails, ends on
+    the login page or lists no courses, which usually means the cookies have
+    expired; callers must never take that for every course being gone.
+    """
+    metrics = get_metrics()
+    with metrics.timer("courses_fetch"):
+        response = session.get(f"{config['BASE_URL']}/courses")
+        response.raise_for_status()
+    if "/login" in urlparse(response.url).path:
+        raise ValueError("Redirected to the login page, the cookies have probably expired")
+    with metrics.timer("courses_parse"):
+        courses = parse_courses(response.text)
+    if not courses:
+        raise ValueError("No courses found on the course list, the cookies may have expired")
+    return courses
+
+def index_courses_and_files(session, on_file=None, config=None):
+    """Index all courses, modules, and files, including file sizes.
+
+    If `on_file` is given it receives each file record as soon as it is known,
+    and the index is saved after every course so a pipelined download stage
+    can start immediately without risking the partial index. `config`
+    defaults to config.json.
+    """
+    config = config or load_config()
+    incremental = False
 
     # Try to load existing index
-    existing_data = load_index_file()
+    existing_data = load_index_file(config)
     if existing_data:
         logger.info(f"Loaded existing index with {existing_data['total_courses']} courses and {existing_data['total_files']} files")
         print(f"Found existing index with {existing_data['total_courses']} courses and {existing_data['total_files']} files")
@@ -56,162 +513,70 @@ def index_courses_and_files(session):
         if config.get("static_settings", False):
             reindex = config.get("always_reindex", False)
             redownload = config.get("always_redownload", False)
+            incremental = reindex and config.get("incremental_reindex", False)
         else:
             # Ask user if they want to re-index
-            reindex = input("Do you want to re-index all courses? (y/n): ").strip().lower() == 'y'
+            answer = input("Do you want to re-index all courses? (y/n, i = only changed courses): ").strip().lower()
+            reindex = answer in ('y', 'i')
+            incremental = answer == 'i'
             if not reindex:
                 redownload = input("Do you want to re-download all files? (y/n): ").strip().lower() == 'y'
 
         if not reindex:
-            # Check which files are already downloaded
-            existing_data = check_downloaded_files(existing_data)
+            # Check which files are already downloaded (this also marks every
+            # complete file as downloaded, which is all the no-redownload case needs)
+            existing_data = check_downloaded_files(existing_data, config=config)
 
             if not redownload:
-                # Mark all existing files as downloaded if not re-downloading
-                for course in existing_data["courses"]:
-                    for module in course["modules"]:
-                        for file in module["files"]:
-                            if os.path.exists(file["path"]):
-                                file["downloaded"] = True
                 return existing_data
 
     data = {"courses": [], "download_log": {}}
+    previous_courses = {}
+    if incremental:
+        data["download_log"] = existing_data.get("download_log", {})
+        previous_courses = {str(c["id"]): c for c in existing_data["courses"]}
+
+    # Progress bars are only needed once we actually crawl
+    from tqdm import tqdm
 
     # Step 1: Get courses
-    html = session.get(f"{config['BASE_URL']}/courses").text
-    courses = parse_courses(html)
+    metrics = get_metrics()
+    courses = fetch_courses(session, config)
     total_courses = len(courses)
     logger.info(f"Indexing {total_courses} courses and files...")
 
-    # Main progress bar
-    with tqdm(total=total_courses, unit="course", desc="Indexing courses", position=0, leave=True, file=sys.stdout) as course_pbar:
-        for i, course in enumerate(courses, 1):
-            course_name = course['name']
-
-            # Spinner for current course
-            spinner = Spinner(f"Fetching {course_name}")
-            spinner.start()
+    cache = ResponseCache.from_config(config)
 
-            course_data = {"name": course_name, "id": course['id'], "modules": []}
-            try:
-                modules_html = session.get(f"{config['BASE_URL']}/courses/{course['id']}/modules").text
-            except requests.HTTPError as e:
-                logger.info(f"Failed to fetch modules page: {e}")
-                spinner.stop()
-                course_pbar.update(1)
-                course_pbar.refresh()
-                continue
-            except Exception as e:
-                logger.info(f"Failed to fetch modules page: {e}")
-                spinner.stop()
-                course_pbar.update(1)
-                course_pbar.refresh()
-                continue
-
-            spinner.stop()
-            modules = parse_modules_and_items(modules_html, course['id'])
-
-            # Print course name with tqdm.write
-            tqdm.write(f"  {course_name}")
-
-            # Count total files for this course
-            total_files = 0
-            for module in modules:
-                total_files += len(module['items'])
-
-            # Nested progress bar for files in this course
-            with tqdm(total=total_files, unit="file", desc="Files", position=1, leave=False, file=sys.stdout) as file_pbar:
-                for module in modules:
-                    module_data = {"name": module['name'], "files": []}
-                    logger.info(f"Indexing module: {module['name']}")
-
-                    for item in module['items']:
-                        try:
-                            item_page = session.get(item['url'], allow_redirects=True, stream=True)
-                            item_page.raise_for_status()
-                            redirected_url, page_html = item_page.url, item_page.text
-                        except requests.HTTPError as e:
-                            logger.info(f"Failed to fetch module item page: {e}")
-                            file_pbar.update(1)
-                            continue
-                        except Exception as e:
-                            logger.info(f"Failed to fetch module item page: {e}")
-                            file_pbar.update(1)
-                            continue
-
-                        file_name, download_url = parse_file_download_link(page_html, config['BASE_URL'])
-                        if file_name and download_url:
-                            try:
-                                head = session.head(download_url, allow_redirects=True)
-                                file_size = int(head.headers.get('content-length', 0))
-                                file_data = {
-                                    "name": file_name,
-                                    "url": download_url,
-                                    "size": file_size,
-                                    "downloaded": os.path.exists(os.path.join(config['DOWNLOAD_DIR'], course_name, module['name'], file_name)),
-                                    "path": os.path.join(config['DOWNLOAD_DIR'], course_name, module['name'], file_name)
-                                }
-                                module_data["files"].append(file_data)
-                                logger.info(f"Found file: {file_name} ({file_size} bytes)")
-                            except Exception as e:
-                                logger.info(f"Could not get file size for {file_name}: {e}")
-                                file_data = {
-                                    "name": file_name,
-                                    "url": download_url,
-                                    "size": 0,
-                                    "downloaded": os.path.exists(os.path.join(config['DOWNLOAD_DIR'], course_name, module['name'], file_name)),
-                                    "path": os.path.join(config['DOWNLOAD_DIR'], course_name, module['name'], file_name)
-                                }
-                                module_data["files"].append(file_data)
-                        elif "/pages/" in redirected_url:
-                            soup = BeautifulSoup(page_html, "html.parser")
-                            for a in soup.find_all('a', href=True):
-                                href = a['href']
-                                text = a.text.strip()
-                                if not href or href.startswith('mailto:') or href.startswith('#'):
-                                    continue
-                                if href.startswith("/"):
-                                    full_url = config['BASE_URL'] + href
-                                else:
-                                    full_url = href
-                                if is_downloadable_file(full_url, text):
-                                    filename = get_filename_from_url_or_text(full_url, text)
-                                    try:
-                                        head = session.head(full_url, allow_redirects=True)
-                                        file_size = int(head.headers.get('content-length', 0))
-                                        file_data = {
-                                            "name": filename,
-                                            "url": full_url,
-                                            "size": file_size,
-                                            "downloaded": os.path.exists(os.path.join(config['DOWNLOAD_DIR'], course_name, module['name'], filename)),
-                                            "path": os.path.join(config['DOWNLOAD_DIR'], course_name, module['name'], filename)
-                                        }
-                                        module_data["files"].append(file_data)
-                                        logger.info(f"Found linked file: {filename} ({file_size} bytes)")
-                                    except Exception as e:
-                                        logger.info(f"Could not get file size for {filename}: {e}")
-                                        file_data = {
-                                            "name": filename,
-                                            "url": full_url,
-                                            "size": 0,
-                                            "downloaded": os.path.exists(os.path.join(config['DOWNLOAD_DIR'], course_name, module['name'], filename)),
-                                            "path": os.path.join(config['DOWNLOAD_DIR'], course_name, module['name'], filename)
-                                        }
-                                        module_data["files"].append(file_data)
-                        file_pbar.update(1)
-                    course_data["modules"].append(module_data)
-
-            course_data["total_modules"] = len(course_data["modules"])
-            course_data["total_files"] = sum(len(m["files"]) for m in course_data["modules"])
-            course_data["total_size"] = sum(f["size"] for m in course_data["modules"] for f in m["files"])
-            data["courses"].append(course_data)
+    # Main progress bar; item pages and HEAD probes fan out over the worker pool
+    workers = max(1, int(config.get("INDEX_WORKERS", 1)))
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+            tqdm(total=total_courses, unit="course", desc="Indexing courses", position=0, leave=True, file=sys.stdout) as course_pbar:
+        for course in courses:
+            previous = previous_courses.get(str(course['id']))
+            with metrics.timer("course"):
+                course_data = index_course(session, executor, config, course, cache, previous, on_file)
+            if course_data:
+                data["courses"].append(course_data)
+                # An unchanged course carried over from the index is already stored
+                if on_file and course_data is not previous:
+                    save_course_index(update_totals(data), course_data["id"], config)
             course_pbar.update(1)
             course_pbar.refresh()
 
-    data["total_courses"] = len(data["courses"])
-    data["total_files"] = sum(c["total_files"] for c in data["courses"])
-    data["total_size"] = sum(c["total_size"] for c in data["courses"])
+    update_totals(data)
+
+    if cache:
+        logger.info(f"HTTP cache: {cache.fresh_hits} fresh, {cache.not_modified} not modified, {cache.misses} fetched")
+        cache.save()
+    negative = get_negative_cache(config)
+    if negative:
+        if negative.skipped:
+            logger.info(f"Skipped {negative.skipped} recently failed URLs while indexing")
+        negative.save()
+    pages = get_page_exporter(config)
+    if pages:
+        pages.close()
 
     # Save the index file
-    save_index_file(data)
+    save_index_file(data, config)
     return data
@@ -1,16 +1,67 @@
 # logger.py
 import os
+import json
+import queue
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from config import load_config
 
+# Pass as extra= for records that belong in the log files but not on the console
+QUIET = {"console": False}
+
+# Expected errors for locked or unpublished content; logged to file only
+QUIET_HTTP_STATUSES = {400, 403}
+
+# Attributes every LogRecord has; anything else came from extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+_queue_handler = None
+
+def error_extra(error):
+    """extra= for logging a caught exception, carrying its HTTP status for the console filter."""
+    response = getattr(error, "response", None)
+    return {"http_status": getattr(response, "status_code", None)}
+
+def show_on_console(record):
+    return getattr(record, "console", True) and getattr(record, "http_status", None) not in QUIET_HTTP_STATUSES
+
+class JSONLinesFormatter(logging.Formatter):
+    """One JSON object per record, including any fields passed through extra=."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key != "console":
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
 def setup_logging():
+    """Route all logging through a queue so worker threads never block on handler I/O.
+
+    Records are formatted once when queued; a background QueueListener writes
+    them to the rotating log file, the console (minus records marked QUIET or
+    carrying a quiet http_status) and, if LOG_JSON_FILE is set, a JSON-lines
+    file. Calling it again returns the already configured root logger.
+    """
+    global _listener, _queue_handler
+    logger = logging.getLogger()
+    if _listener is not None:
+        return logger
+
     config = load_config()
     log_file = config["SCRIPT_LOG_FILE"]
     max_log_files = config.get("MAX_LOG_FILES", 5)
     os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
 
-    logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
     # File handler (logs everything)
@@ -20,21 +71,35 @@ def setup_logging():
         backupCount=max_log_files,
         encoding='utf-8'
     )
-    file_formatter = logging.Formatter('%(asctime)s - %(message)s')
-    file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    handlers = [file_handler]
 
-    # Console handler (suppresses 403/400 errors and module/file logging)
+    # Console handler (suppresses expected 400/403 errors and per-module/per-file records)
     console_handler = logging.StreamHandler()
-    console_formatter = logging.Formatter('%(message)s')
-    console_handler.setFormatter(console_formatter)
-    console_handler.addFilter(lambda record: not (
-        record.getMessage().startswith("Indexing module:") or
-        record.getMessage().startswith("Found file:") or
-        record.getMessage().startswith("Found linked file:") or
-        "403 Client Error" in record.getMessage() or
-        "400 Client Error" in record.getMessage()
-    ))
-    logger.addHandler(console_handler)
+    console_handler.setFormatter(logging.Formatter('%(message)s'))
+    console_handler.addFilter(show_on_console)
+    handlers.append(console_handler)
+
+    json_file = config.get("LOG_JSON_FILE", "")
+    if json_file:
+        os.makedirs(os.path.dirname(json_file) or '.', exist_ok=True)
+        json_handler = RotatingFileHandler(json_file, maxBytes=1024*1024, backupCount=max_log_files, encoding='utf-8')
+        json_handler.setFormatter(JSONLinesFormatter())
+        handlers.append(json_handler)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = QueueHandler(log_queue)
+    logger.addHandler(_queue_handler)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
 
     return logger
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = _queue_handler = None
@@ -1,24 +1,208 @@
 # main.py
-from auth import create_session
-from scraper import parse_courses, parse_modules_and_items, parse_file_download_link, is_downloadable_file, get_filename_from_url_or_text
-from downloader import download_file
+from auth import create_session, create_adapter
+from download_manager import DownloadManager, HostSlots
+from download_scheduler import DownloadQueue, BandwidthLimiter
+from download_log import load_download_log
 from utils import safe_print, clean_filename
-from config import load_config
-from indexer import index_courses_and_files, load_index_file, save_index_file, check_downloaded_files
+from config import load_config, account_configs
+from ratelimit import RequestScheduler
+from blob_store import BlobStore
+from indexer import index_courses_and_files, load_index_file, save_index_file, check_downloaded_files, mark_file_downloaded, iter_files
 import os
 import json
+import argparse
 import logging
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from logger import setup_logging
-from tqdm import tqdm
+from metrics import write_reports, RunProfiler
+from negative_cache import get_negative_cache
+from watcher import CourseWatcher
+from verify import verify_archive
+
+logger = logging.getLogger(__name__)
+
+def run_pipelined(session, config, **shared):
+    """Index and download at the same time, starting each transfer as soon as the indexer finds the file."""
+    redownload = config.get("always_redownload", False)
+    jobs = DownloadQueue.from_config(config)
+    queued = set()
+
+    def enqueue(file):
+        if (not file["downloaded"] or redownload) and id(file) not in queued:
+            queued.add(id(file))
+            jobs.put(file)
+
+    download_log = load_download_log(config)
+    manager = DownloadManager(session, config, download_log, on_complete=partial(mark_file_downloaded, config=config), **shared)
+    consumer = threading.Thread(target=manager.run, args=(jobs,))
+    consumer.start()
+    data = None
+    try:
+        print("Indexing and downloading courses...")
+        data = index_courses_and_files(session, on_file=enqueue, config=config)
+        # Files from a reused index never pass through the indexer callback
+        for file in iter_files(data):
+            enqueue(file)
+    finally:
+        jobs.close()
+        consumer.join()
+        if data is not None:
+            download_log.merge(data["download_log"])
+            data["download_log"] = download_log
+        download_log.close()
+
+    print(f"\nIndexing complete. Found {data['total_courses']} courses, {data['total_files']} files ({data['total_size']/1024/1024:.2f} MB).")
+    manager.print_summary()
+    save_index_file(data, config)
+    print("\nDownload complete!")
+
+def _device(path):
+    """st_dev of `path`, or of its nearest existing parent if it doesn't exist yet."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return os.stat(path).st_dev
+
+def shared_blob_store(config, accounts):
+    """The BlobStore shared by the accounts that have DEDUPE on, or None if none do.
+
+    It lives at BLOB_DIR, else in `.blobs` under the accounts' common parent
+    folder, so hardlinks work whenever their DOWNLOAD_DIRs share a drive.
+    Accounts on another drive than the store get full copies; that is
+    logged and printed at startup.
+    """
+    if not accounts:
+        return None
+    root = config.get("BLOB_DIR")
+    if not root:
+        parent = os.path.commonpath([os.path.abspath(a["DOWNLOAD_DIR"]) for a in accounts])
+        if os.path.dirname(parent) == parent:
+            # Nothing in common but the filesystem root
+            parent = os.path.abspath(accounts[0]["DOWNLOAD_DIR"])
+        root = os.path.join(parent, ".blobs")
+    store = BlobStore(root)
+    names = ", ".join(a["ACCOUNT_NAME"] for a in accounts)
+    logger.info(f"Sharing deduplication store {root} between accounts: {names}")
+    print(f"Deduplicating {names} through {root}")
+    for account in accounts:
+        if _device(account["DOWNLOAD_DIR"]) != _device(root):
+            message = (f"Account {account['ACCOUNT_NAME']}: {account['DOWNLOAD_DIR']} is on another drive than {root}, "
+                       f"so its files are copied instead of hardlinked")
+            logger.info(message)
+            print(message)
+    return store
+
+def run_batch(config, flush_negative_cache=False):
+    """Run every ACCOUNTS profile concurrently in this process.
+
+    Each account keeps its own cookies, index and caches, but they all share
+    one connection pool, the per-host RequestScheduler and connection
+    slots and the bandwidth cap. Accounts with DEDUPE on also share one
+    BlobStore (see shared_blob_store), so a file that several of them can
+    see on the same Canvas host is downloaded once and linked into each
+    account's DOWNLOAD_DIR.
+    """
+    accounts = account_configs(config)
+    if not accounts:
+        print("No ACCOUNTS configured in config.json.")
+        return
+    if flush_negative_cache:
+        for account in accounts:
+            negative = get_negative_cache(account)
+            if negative:
+                negative.flush()
+    scheduler = RequestScheduler.from_config(config)
+    pool_size = sum(max(int(a.get("INDEX_WORKERS", 1)), int(a.get("DOWNLOAD_WORKERS", 4))) for a in accounts)
+    adapter = create_adapter(max(10, pool_size))
+    blob_store = shared_blob_store(config, [a for a in accounts if a.get("DEDUPE", False)])
+    shared = {
+        "limiter": BandwidthLimiter.from_config(config),
+        "host_slots": HostSlots(max(1, int(config.get("MAX_CONNECTIONS_PER_HOST", config.get("DOWNLOAD_WORKERS", 4))))),
+    }
+
+    def run_account(account):
+        store = blob_store if account.get("DEDUPE", False) else None
+        run(account, create_session(scheduler, account, adapter), blob_store=store, **shared)
+
+    print(f"Running {len(accounts)} accounts: {', '.join(a['ACCOUNT_NAME'] for a in accounts)}")
+    failed = []
+    with ThreadPoolExecutor(max_workers=len(accounts)) as executor:
+        futures = {executor.submit(run_account, account): account for account in accounts}
+        for future in as_completed(futures):
+            account = futures[future]
+            name = account["ACCOUNT_NAME"]
+            try:
+                future.result()
+                print(f"\nAccount {name} finished.")
+            except Exception as e:
+                logger.info(f"Account {name} failed: {e}")
+                print(f"\nAccount {name} failed: {e}")
+                failed.append(name)
+            negative = get_negative_cache(account)
+            if negative and negative.skipped:
+                print(f"Account {name} skipped {negative.skipped} requests to URLs that failed recently. "
+                      f"Run with --flush-negative-cache to retry them.")
+    if failed:
+        print(f"{len(failed)} of {len(accounts)} accounts failed: {', '.join(failed)}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Index and download Canvas course files.")
+    parser.add_argument("--profile", nargs="?", const="data/profile.pstats", metavar="FILE",
+                        help="write a cProfile dump of the run (default: data/profile.pstats)")
+    parser.add_argument("--flush-negative-cache", action="store_true",
+                        help="forget recently failed URLs and request them again")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running, polling each course for changes and downloading new files")
+    parser.add_argument("--verify", nargs="?", const="changed", choices=("changed", "all"),
+                        help="check downloaded files against the index without contacting Canvas; "
+                             "'all' also rehashes files unchanged since the last check")
+    parser.add_argument("--batch", action="store_true",
+                        help="index and download every account listed in ACCOUNTS concurrently")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     logger = setup_logging()
     config = load_config()
-    session = create_session()
+    negative = get_negative_cache(config)
+    if negative and args.flush_negative_cache:
+        negative.flush()
+        print("Negative cache flushed.")
+    profiler = RunProfiler() if args.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        if args.verify:
+            verify_archive(config, full=args.verify == "all")
+        elif args.batch:
+            run_batch(config, flush_negative_cache=args.flush_negative_cache)
+        elif args.watch:
+            CourseWatcher(create_session(), config).run()
+        else:
+            run(config)
+        if negative and negative.skipped:
+            print(f"Skipped {negative.skipped} requests to URLs that failed recently. "
+                  f"Run with --flush-negative-cache to retry them.")
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump(args.profile)
+            print(f"Profile written to {args.profile}")
+        write_reports(config)
+
+def run(config, session=None, **shared):
+    """Index, then download what is missing. `shared` is passed on to the DownloadManager (see run_batch)."""
+    session = session or create_session(config=config)
+
+    if config.get("PIPELINE_DOWNLOADS", False):
+        run_pipelined(session, config, **shared)
+        return
 
     # Step 1: Index all courses and files (or load existing index)
     print("Indexing courses...")
-    data = index_courses_and_files(session)
+    data = index_courses_and_files(session, config=config)
 
     # Count how many files need to be downloaded
     files_to_download = 0
@@ -48,23 +232,26 @@ def main():
 
     # Step 2: Download files
     print("\nStarting download...")
-    with tqdm(total=files_to_download, unit="file", desc="Downloading") as pbar:
-        for course in data["courses"]:
-            for module in course["modules"]:
-                if module["files"]:
-                    os.makedirs(os.path.dirname(module["files"][0]["path"]), exist_ok=True)
-                for file in module["files"]:
-                    if not file["downloaded"] or config.get("always_redownload", False):
-                        try:
-                            download_file(session, file["url"], file["path"], data["download_log"])
-                            file["downloaded"] = True
-                            data["download_log"][os.path.abspath(file["path"])] = True
-                        except Exception as e:
-                            logger.info(f"Error downloading {file['name']}: {e}")
-                        pbar.update(1)
+    pending = DownloadQueue.from_config(config)
+    total_bytes = 0
+    for file in iter_files(data):
+        if not file["downloaded"] or config.get("always_redownload", False):
+            pending.put(file)
+            total_bytes += file.get("size", 0)
+    pending.close()
+    # Completed files are journaled as they finish, so a crash mid-run keeps them
+    download_log = load_download_log(config)
+    download_log.merge(data["download_log"])
+    data["download_log"] = download_log
+    manager = DownloadManager(session, config, download_log, on_complete=partial(mark_file_downloaded, config=config), **shared)
+    try:
+        manager.run(pending, total_bytes)
+    finally:
+        download_log.close()
+    manager.print_summary()
 
     # Save updated data file
-    save_index_file(data)
+    save_index_file(data, config)
     print("\nDownload complete!")
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+# manifest.py
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Manifest:
+    """In-memory map of every file under a download directory: path -> (size, mtime).
+
+    Built with a single os.scandir walk so "is this file downloaded and
+    complete?" never needs a per-file stat, which matters on network-mounted
+    DOWNLOAD_DIRs. Hidden directories (such as the dedupe store) are skipped.
+    The downloader records files it writes so the map stays current for the
+    rest of the run.
+    """
+
+    def __init__(self, root):
+        self.cwd = os.getcwd()
+        self.root = self.abspath(root)
+        self.entries = {}
+        self.dirs = set()
+        self.lock = threading.Lock()
+
+    def abspath(self, path):
+        """os.path.abspath against the cwd captured at construction, without a getcwd per call."""
+        return os.path.normpath(os.path.join(self.cwd, path))
+
+    def covers(self, abs_path):
+        return abs_path == self.root or abs_path.startswith(self.root + os.sep)
+
+    def scan(self):
+        entries = {}
+        dirs = set()
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    dirs.add(directory)
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith('.'):
+                                stack.append(entry.path)
+                        elif entry.is_file():
+                            st = entry.stat()
+                            entries[entry.path] = (st.st_size, st.st_mtime)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.info(f"Could not scan {directory}: {e}")
+        with self.lock:
+            self.entries = entries
+            self.dirs = dirs
+        logger.info(f"Scanned {len(entries)} files under {self.root}")
+        return self
+
+    def stat(self, path):
+        """(size, mtime) for `path`, or None if it doesn't exist."""
+        abs_path = self.abspath(path)
+        if not self.covers(abs_path):
+            try:
+                st = os.stat(abs_path)
+            except OSError:
+                return None
+            return st.st_size, st.st_mtime
+        with self.lock:
+            return self.entries.get(abs_path)
+
+    def is_complete(self, path, expected_size=0):
+        """True if `path` exists and, when the size is known, has exactly that many bytes."""
+        entry = self.stat(path)
+        return entry is not None and (not expected_size or entry[0] == expected_size)
+
+    def record(self, path):
+        """Refresh one path from disk after it was written, renamed or removed."""
+        abs_path = self.abspath(path)
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            with self.lock:
+                self.entries.pop(abs_path, None)
+            return
+        with self.lock:
+            self.entries[abs_path] = (st.st_size, st.st_mtime)
+
+    def ensure_dir(self, directory):
+        """os.makedirs(directory, exist_ok=True), skipped for directories already seen."""
+        abs_dir = self.abspath(directory)
+        with self.lock:
+            if abs_dir in self.dirs:
+                return
+        os.makedirs(abs_dir, exist_ok=True)
+        with self.lock:
+            self.dirs.add(abs_dir)
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def get_manifest(root):
+    """The shared Manifest for `root`, scanning it the first time it is requested."""
+    with _manifests_lock:
+        manifest = _manifests.get(root)
+        if manifest is None:
+            manifest = _manifests[root] = Manifest(root).scan()
+        return manifest
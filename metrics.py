@@ -0,0 +1,240 @@
+# metrics.py
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds, Prometheus style
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+# Counter families whose "result" label splits into hits and misses
+CACHE_COUNTERS = {
+    "http_cache": ("http_cache_lookups_total", ("fresh", "not_modified")),
+    "dedupe": ("dedupe_lookups_total", ("hit",)),
+}
+
+PROMETHEUS_PREFIX = "canvas_downloader_"
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (the max for the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_seconds": self.sum,
+            "mean_seconds": self.sum / self.count if self.count else 0.0,
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+            "max_seconds": self.max,
+            "buckets": {("+Inf" if b == float("inf") else str(b)): n for b, n in zip(BUCKETS, self.counts)},
+        }
+
+class Metrics:
+    """Thread-safe counters and per-stage timing histograms for one run.
+
+    Counters are keyed by name plus keyword labels, e.g.
+    incr("http_responses_total", status="200"). Stage timings go through
+    `timer(stage)` or `observe(stage, seconds)`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def incr(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def counter(self, name, **labels):
+        """Sum of `name` over every label set that includes `labels`."""
+        wanted = set(labels.items())
+        with self.lock:
+            return sum(v for (n, l), v in self.counters.items() if n == name and wanted <= set(l))
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def cache_rates(self):
+        rates = {}
+        for cache, (name, hit_results) in CACHE_COUNTERS.items():
+            total = self.counter(name)
+            if not total:
+                continue
+            hits = sum(self.counter(name, result=r) for r in hit_results)
+            rates[cache] = {"lookups": total, "hits": hits, "hit_rate": hits / total}
+        return rates
+
+    def report(self):
+        with self.lock:
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                label_text = ",".join(f"{k}={v}" for k, v in labels)
+                counters[f"{name}{{{label_text}}}" if label_text else name] = value
+            stages = {stage: h.to_dict() for stage, h in sorted(self.histograms.items())}
+        return {
+            "started": self.started,
+            "elapsed_seconds": time.time() - self.started,
+            "stages": stages,
+            "counters": counters,
+            "caches": self.cache_rates(),
+        }
+
+    def write_json(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=4)
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            metric = PROMETHEUS_PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_prometheus_labels(labels)} {value}")
+        metric = PROMETHEUS_PREFIX + "stage_duration_seconds"
+        if histograms:
+            lines.append(f"# TYPE {metric} histogram")
+        for stage, h in histograms:
+            cumulative = 0
+            for bound, n in zip(BUCKETS, h.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{metric}_bucket{_prometheus_labels((('stage', stage), ('le', le)))} {cumulative}")
+            lines.append(f"{metric}_sum{_prometheus_labels((('stage', stage),))} {h.sum}")
+            lines.append(f"{metric}_count{_prometheus_labels((('stage', stage),))} {h.count}")
+        for cache, rate in self.cache_rates().items():
+            lines.append(f"{PROMETHEUS_PREFIX}cache_hit_ratio{_prometheus_labels((('cache', cache),))} {rate['hit_rate']}")
+        lines.append(f"{PROMETHEUS_PREFIX}last_run_timestamp_seconds {time.time()}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # The node_exporter textfile collector may read at any time, so write aside and rename
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+class RunProfiler:
+    """cProfile the calling thread and every thread started while enabled, dumped as one file.
+
+    cProfile only follows the thread that enabled it, and nearly all indexing
+    and download work runs on worker pools, so each new thread gets its own
+    profiler and the results are merged with pstats.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.main = cProfile.Profile()
+        self.threads = []
+
+    def _profile_thread(self, frame, event, arg):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows a single profiler, which already covers every thread
+            sys.setprofile(None)
+            return
+        with self.lock:
+            self.threads.append(profiler)
+
+    def enable(self):
+        threading.setprofile(self._profile_thread)
+        self.main.enable()
+
+    def disable(self):
+        self.main.disable()
+        threading.setprofile(None)
+
+    def dump(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        stats = pstats.Stats(self.main)
+        with self.lock:
+            profilers = list(self.threads)
+        for profiler in profilers:
+            stats.add(profiler)
+        stats.dump_stats(path)
+
+_metrics = Metrics()
+
+def get_metrics():
+    """The process-wide Metrics instance every module records into."""
+    return _metrics
+
+def write_reports(config, metrics=None):
+    """Write the JSON report (METRICS_FILE) and, if configured, the Prometheus textfile."""
+    metrics = metrics or _metrics
+    json_path = config.get("METRICS_FILE", "data/metrics.json")
+    if json_path:
+        metrics.write_json(json_path)
+        logger.info(f"Metrics report written to {json_path}")
+    prometheus_path = config.get("PROMETHEUS_TEXTFILE", "")
+    if prometheus_path:
+        metrics.write_prometheus(prometheus_path)
+        logger.info(f"Prometheus metrics written to {prometheus_path}")
@@ -0,0 +1,148 @@
+# negative_cache.py
+import os
+import json
+import time
+import threading
+import logging
+from metrics import get_metrics
+from ratelimit import is_throttled
+
+logger = logging.getLogger(__name__)
+
+# Seconds to skip a URL after a failure, by exact status, status class or
+# "error" for timeouts and connection failures. 0 means never skip.
+DEFAULT_TTLS = {
+    "400": 7 * 86400,
+    "401": 0,  # an expired session, not a property of the URL
+    "403": 7 * 86400,
+    "404": 7 * 86400,
+    "410": 30 * 86400,
+    "429": 300,
+    "4xx": 86400,
+    "5xx": 3600,
+    "error": 900,
+}
+
+def response_status(response):
+    """Status to record for a failed response: Canvas's rate-limit 403 counts as a 429, so it expires quickly."""
+    if is_throttled(response):
+        return 429
+    return response.status_code
+
+def failure_status(error):
+    """Status to record for a requests exception, or None for timeouts and connection errors."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    return response_status(response)
+
+class NegativeCache:
+    """Persistent record of URLs that recently failed, so re-runs don't keep re-requesting them.
+
+    Entries hold the status code and failure time; a URL is skipped until
+    the TTL for its status has passed. Successful requests clear the entry.
+    """
+
+    def __init__(self, path, ttls=None):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.skipped = 0
+        self.dirty = False
+
+    @classmethod
+    def from_config(cls, config):
+        """Create and load the cache described by config, or None if it is disabled."""
+        if not config.get("NEGATIVE_CACHE", True):
+            return None
+        cache = cls(
+            config.get("NEGATIVE_CACHE_FILE", "data/negative_cache.json"),
+            {str(k): v for k, v in (config.get("NEGATIVE_CACHE_TTLS") or {}).items()}
+        )
+        cache.load()
+        return cache
+
+    def ttl_for(self, status):
+        if status is None:
+            return self.ttls["error"]
+        return self.ttls.get(str(status), self.ttls.get(f"{status // 100}xx", 0))
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logger.info(f"Failed to load negative cache: {e}")
+                self.entries = {}
+        self.evict()
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.evict_locked()
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+    def evict(self):
+        with self.lock:
+            self.evict_locked()
+
+    def evict_locked(self):
+        now = time.time()
+        expired = [url for url, e in self.entries.items() if now >= e["failed_at"] + self.ttl_for(e["status"])]
+        for url in expired:
+            del self.entries[url]
+        if expired:
+            self.dirty = True
+
+    def should_skip(self, url):
+        """True if `url` failed recently enough that it shouldn't be requested again yet."""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None or time.time() >= entry["failed_at"] + self.ttl_for(entry["status"]):
+                return False
+            self.skipped += 1
+        get_metrics().incr("negative_cache_skips_total", status=str(entry["status"] or "error"))
+        return True
+
+    def record_failure(self, url, status):
+        if not self.ttl_for(status):
+            return
+        with self.lock:
+            self.entries[url] = {"status": status, "failed_at": time.time()}
+            self.dirty = True
+
+    def record_success(self, url):
+        with self.lock:
+            if self.entries.pop(url, None) is not None:
+                self.dirty = True
+
+    def flush(self):
+        """Forget every recorded failure, on disk as well."""
+        with self.lock:
+            self.entries = {}
+            self.skipped = 0
+            self.dirty = False
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_negative_cache(config):
+    """The shared NegativeCache for config's NEGATIVE_CACHE_FILE, or None if disabled."""
+    if not config.get("NEGATIVE_CACHE", True):
+        return None
+    path = config.get("NEGATIVE_CACHE_FILE", "data/negative_cache.json")
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = NegativeCache.from_config(config)
+        return cache
@@ -0,0 +1,175 @@
+# page_export.py
+import os
+import json
+import hashlib
+import threading
+import multiprocessing
+import logging
+from functools import partial
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor, wait
+from scraper import parse_wiki_page
+from metrics import get_metrics
+from utils import clean_filename
+
+logger = logging.getLogger(__name__)
+
+def is_wiki_page(url):
+    return "/pages/" in url
+
+def render_markdown(title, body_html, base_url, local_links):
+    """Convert a wiki page body to Markdown. Runs in a worker process.
+
+    Links and images in `local_links` (absolute URL -> file name) point to
+    the downloaded copy next to the .md file; other site-relative links are
+    made absolute so they still open in Canvas.
+    """
+    import html2text
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(body_html, "html.parser")
+    for tag, attr in (("a", "href"), ("img", "src")):
+        for element in soup.find_all(tag, attrs={attr: True}):
+            target = element[attr]
+            absolute = base_url + target if target.startswith("/") else target
+            if absolute in local_links:
+                element[attr] = quote(local_links[absolute])
+            elif absolute != target:
+                element[attr] = absolute
+    converter = html2text.HTML2Text()
+    converter.body_width = 0
+    return f"# {title}\n\n" + converter.handle(str(soup))
+
+class PageExporter:
+    """Saves Canvas wiki pages as Markdown next to their module's files.
+
+    The indexer hands over every wiki page it fetches; html2text runs in a
+    process pool so conversion doesn't hold up crawling. The cache file maps
+    each module item URL to the hash of the title, body and links last
+    converted and the file written, so unchanged pages are not converted
+    again.
+    """
+
+    def __init__(self, path, base_url, workers=0):
+        self.path = path
+        self.base_url = base_url
+        self.workers = workers or None
+        self.entries = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.pool = None
+        self.dirty = False
+
+    @classmethod
+    def from_config(cls, config):
+        """Create and load the exporter described by config, or None if it is disabled."""
+        if not config.get("EXPORT_PAGES", False):
+            return None
+        exporter = cls(config.get("EXPORT_CACHE_FILE", "data/page_exports.json"), config["BASE_URL"],
+                       config.get("EXPORT_WORKERS", 0))
+        exporter.load()
+        return exporter
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logger.info(f"Failed to load page export cache: {e}")
+                self.entries = {}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+    def is_current(self, item_url):
+        with self.lock:
+            entry = self.entries.get(item_url)
+        return entry is not None and os.path.exists(entry["path"])
+
+    def needs_fetch(self, item_url, final_url):
+        """True if a cached item page is a wiki page without an up-to-date export, so it must be fetched in full."""
+        return bool(final_url) and is_wiki_page(final_url) and not self.is_current(item_url)
+
+    def export(self, item, page_html, module_dir, local_links):
+        """Queue the wiki page `page_html` of module item `item` for conversion unless it is unchanged."""
+        page = parse_wiki_page(page_html)
+        if page is None:
+            logger.info(f"No page body found in {item['url']}")
+            return
+        title, body = page
+        title = title or item["title"]
+        path = os.path.join(module_dir, (clean_filename(title).strip() or "page") + ".md")
+        digest = hashlib.sha1(json.dumps([title, body, local_links, self.base_url], sort_keys=True).encode("utf-8")).hexdigest()
+        with self.lock:
+            entry = self.entries.get(item["url"])
+            if entry and entry["hash"] == digest and entry["path"] == path and os.path.exists(path):
+                get_metrics().incr("pages_exported_total", result="unchanged")
+                return
+            if item["url"] in self.pending:
+                return
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            future = self.pool.submit(render_markdown, title, body, self.base_url, local_links)
+            self.pending[item["url"]] = future
+        future.add_done_callback(partial(self._write, item["url"], path, digest))
+
+    def _write(self, item_url, path, digest, future):
+        try:
+            markdown = future.result()
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(markdown)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.info(f"Failed to export page {os.path.basename(path)}: {e}")
+            get_metrics().incr("pages_exported_total", result="failed")
+            with self.lock:
+                self.pending.pop(item_url, None)
+            return
+        with self.lock:
+            self.pending.pop(item_url, None)
+            previous = self.entries.get(item_url)
+            self.entries[item_url] = {"hash": digest, "path": path}
+            self.dirty = True
+        # A renamed page leaves its old export behind
+        if previous and previous["path"] != path and os.path.exists(previous["path"]):
+            os.remove(previous["path"])
+        get_metrics().incr("pages_exported_total", result="converted")
+        logger.info(f"Exported page: {path}")
+
+    def flush(self):
+        """Wait for queued conversions and save the cache."""
+        with self.lock:
+            futures = list(self.pending.values())
+        wait(futures)
+        self.save()
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool:
+            pool.shutdown()
+
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+def get_page_exporter(config):
+    """The shared PageExporter for config's EXPORT_CACHE_FILE, or None if disabled."""
+    if not config.get("EXPORT_PAGES", False):
+        return None
+    path = config.get("EXPORT_CACHE_FILE", "data/page_exports.json")
+    with _exporters_lock:
+        exporter = _exporters.get(path)
+        if exporter is None:
+            exporter = _exporters[path] = PageExporter.from_config(config)
+        return exporter
@@ -0,0 +1,210 @@
+# ratelimit.py
+import time
+import random
+import threading
+import logging
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def parse_retry_after(response):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_throttled(response):
+    """429, or Canvas's 403 'Rate Limit Exceeded' signalled by an exhausted X-Rate-Limit-Remaining."""
+    if response.status_code == 429:
+        return True
+    remaining = response.headers.get("X-Rate-Limit-Remaining")
+    if response.status_code == 403 and remaining is not None:
+        try:
+            return float(remaining) <= 0
+        except ValueError:
+            return False
+    return False
+
+class HostBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.limit_estimate = None
+        self.held_back = False
+        self.sent = deque(maxlen=50)
+
+    def observed_rate(self):
+        if len(self.sent) < 2 or self.sent[-1] == self.sent[0]:
+            return None
+        return (len(self.sent) - 1) / (self.sent[-1] - self.sent[0])
+
+class RequestScheduler:
+    """Per-host token bucket with AIMD adaptation, shared by every session request.
+
+    Each host starts at 1 / WAIT_BETWEEN_REQUESTS requests per second (0 means
+    unpaced). That is a starting point, not a ceiling: while requests are
+    actually held back by the pacing, every success raises the rate by 5%
+    until the server first throttles. A throttled or 5xx response halves the
+    host's rate and remembers it as the host's apparent limit; successes then
+    add rate back quickly until 90% of that limit and only slowly beyond it,
+    so throughput settles just under what the server accepts. Retry-After
+    pauses the whole host.
+    """
+
+    def __init__(self, wait_between_requests=0.5, burst=1, max_retries=5,
+                 backoff_base=1.0, max_backoff=60.0, min_rate=0.05):
+        self.start_rate = 1.0 / wait_between_requests if wait_between_requests else 0.0
+        self.burst = max(1, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.min_rate = min_rate
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.throttle_count = 0
+        self.retry_count = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            wait_between_requests=config.get("WAIT_BETWEEN_REQUESTS", 0.5),
+            burst=config.get("RATE_LIMIT_BURST", 1),
+            max_retries=config.get("MAX_RETRIES", 5),
+            backoff_base=config.get("BACKOFF_BASE", 1.0),
+            max_backoff=config.get("MAX_BACKOFF", 60.0)
+        )
+
+    def _bucket(self, host):
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = HostBucket(self.start_rate, self.burst)
+        return bucket
+
+    def acquire(self, host):
+        """Block until a request to `host` may be sent."""
+        while True:
+            with self.lock:
+                bucket = self._bucket(host)
+                now = time.monotonic()
+                wait = bucket.paused_until - now
+                if wait <= 0:
+                    if not bucket.rate:
+                        bucket.sent.append(now)
+                        return
+                    bucket.tokens = min(bucket.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+                    bucket.updated = now
+                    if bucket.tokens >= 1:
+                        bucket.tokens -= 1
+                        bucket.sent.append(now)
+                        return
+                    wait = (1 - bucket.tokens) / bucket.rate
+                    bucket.held_back = True
+            time.sleep(wait)
+
+    def throttled(self, host, retry_after=None):
+        """Multiplicative decrease after a 429/5xx, plus a host-wide pause for Retry-After."""
+        with self.lock:
+            bucket = self._bucket(host)
+            current = bucket.rate or bucket.observed_rate() or 1.0
+            bucket.limit_estimate = current
+            bucket.rate = max(self.min_rate, current / 2)
+            bucket.tokens = 0
+            bucket.updated = time.monotonic()
+            if retry_after:
+                bucket.paused_until = max(bucket.paused_until, time.monotonic() + retry_after)
+            self.throttle_count += 1
+            return bucket.rate
+
+    def succeeded(self, host):
+        """Raise the rate of a host whose requests are held back by it.
+
+        Multiplicative until the first throttle, then additive, slowing down
+        once near the last rate that got throttled. Only a request that had
+        to wait for the pacing since the last increase raises it, so a host
+        sending below its rate (latency-bound, or few workers) is left alone.
+        """
+        with self.lock:
+            bucket = self._bucket(host)
+            if not bucket.rate or not bucket.held_back:
+                return
+            bucket.held_back = False
+            if bucket.limit_estimate is None:
+                bucket.rate *= 1.05
+                return
+            step = bucket.limit_estimate * 0.05
+            if bucket.rate >= bucket.limit_estimate * 0.9:
+                step /= 10
+            bucket.rate += step
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Retry-After plus a little jitter, else full-jitter exponential backoff."""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** attempt))
+
+class ThrottledSession(requests.Session):
+    """requests.Session whose every send (redirect hops included) goes through a RequestScheduler."""
+
+    def __init__(self, scheduler):
+        super().__init__()
+        self.scheduler = scheduler
+
+    def send(self, request, **kwargs):
+        host = urlparse(request.url).netloc
+        metrics = get_metrics()
+        for attempt in range(self.scheduler.max_retries + 1):
+            last_attempt = attempt == self.scheduler.max_retries
+            with metrics.timer("throttle_wait"):
+                self.scheduler.acquire(host)
+            metrics.incr("http_requests_total", method=request.method)
+            try:
+                response = super().send(request, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.incr("http_errors_total", kind=type(e).__name__)
+                if last_attempt:
+                    raise
+                delay = self.scheduler.backoff_delay(attempt)
+                self.scheduler.retry_count += 1
+                logger.info(f"Request to {host} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            # This hop's own response; later redirect hops are recorded by their nested send()
+            first = response.history[0] if response.history else response
+            metrics.observe("request", first.elapsed.total_seconds())
+            metrics.incr("http_responses_total", status=str(first.status_code))
+            if request.method != "HEAD":
+                metrics.incr("http_response_bytes_total", int(first.headers.get("Content-Length") or 0))
+
+            # Redirect hops are sent (and retried) by nested send() calls
+            if response.history or last_attempt:
+                break
+            throttled = is_throttled(response)
+            if not throttled and response.status_code not in RETRY_STATUSES:
+                self.scheduler.succeeded(host)
+                break
+
+            retry_after = parse_retry_after(response)
+            rate = self.scheduler.throttled(host, retry_after)
+            delay = self.scheduler.backoff_delay(attempt, retry_after)
+            self.scheduler.retry_count += 1
+            metrics.incr("http_throttled_total" if throttled else "http_retries_total")
+            logger.info(f"{'Throttled' if throttled else 'Server error'} ({response.status_code}) from {host}, "
+                        f"slowing to {rate:.2f} req/s and retrying in {delay:.1f}s")
+            response.close()
+            time.sleep(delay)
+        return response
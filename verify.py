@@ -0,0 +1,206 @@
+# verify.py
+import os
+import time
+import shutil
+import hashlib
+import multiprocessing
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from blob_store import BlobStore, canonical_key
+from download_log import load_download_log
+from downloader import PART_SUFFIX
+from indexer import load_index_file, save_index_file, iter_files, update_totals
+from manifest import get_manifest
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 8 * 1024 * 1024
+CORRUPT_SUFFIX = ".corrupt"
+VERIFY_FIELDS = ("sha256", "verified_size", "verified_mtime")
+
+def digest_file(path, block_size=BLOCK_SIZE):
+    """(sha256 hex digest, size, mtime) of `path`. Runs in a worker process.
+
+    Reads go through one reused buffer in `block_size` blocks, with the
+    kernel told to expect sequential access, so hashing runs at disk speed.
+    """
+    digest = hashlib.sha256()
+    view = memoryview(bytearray(block_size))
+    with open(path, "rb", buffering=0) as f:
+        st = os.fstat(f.fileno())
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while True:
+            n = f.readinto(view)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest(), st.st_size, st.st_mtime
+
+class ArchiveVerifier:
+    """Check the files under DOWNLOAD_DIR against the index.
+
+    Sizes are compared first, from one scan of DOWNLOAD_DIR. Files that
+    pass are hashed in a process pool. Each file's sha256, size and mtime
+    are stored in its index record, so later runs only rehash files whose
+    size or mtime changed (all files with `full`, which also catches bit
+    rot). With DEDUPE on, digests are also checked against the blob store.
+
+    Failed files are reset to downloaded: false and moved out of the way so
+    the next run fetches them again. Truncated files become .part files and
+    resume (from a private copy if the file is hardlinked elsewhere). Files
+    with the wrong content are renamed to .corrupt and kept. Either way the
+    file's blob is dropped from the store so it is not linked again.
+    """
+
+    def __init__(self, config, data, full=False):
+        self.config = config
+        self.data = data
+        self.full = full
+        self.workers = config.get("VERIFY_WORKERS", 0) or None
+        # Rescan: the point is to see what is on disk now
+        self.manifest = get_manifest(config["DOWNLOAD_DIR"]).scan()
+        self.blob_store = BlobStore.from_config(config)
+        self.download_log = None
+        self.results = {"ok": 0, "unchanged": 0, "missing": 0, "truncated": 0, "size": 0, "digest": 0, "error": 0}
+        self.failed = []
+        self.hashed_bytes = 0
+
+    def count(self, result):
+        self.results[result] += 1
+        get_metrics().incr("verify_files_total", result=result)
+
+    def fail(self, file, reason):
+        """Reset `file` so it is downloaded again and move its bad copy aside."""
+        self.count(reason)
+        self.failed.append((file, reason))
+        logger.info(f"Verification failed ({reason}): {file['path']}")
+        file["downloaded"] = False
+        for field in VERIFY_FIELDS:
+            file.pop(field, None)
+        abs_path = self.manifest.abspath(file["path"])
+        self.data["download_log"].pop(abs_path, None)
+        if abs_path in self.download_log:
+            del self.download_log[abs_path]
+        if reason == "missing":
+            return
+        self.drop_blob(file)
+        if reason == "truncated":
+            part_path = file["path"] + PART_SUFFIX
+            if os.stat(file["path"]).st_nlink > 1:
+                # Still linked elsewhere: resuming would write into the shared inode, so resume a private copy
+                shutil.copyfile(file["path"], part_path)
+                os.remove(file["path"])
+            else:
+                os.replace(file["path"], part_path)
+            self.manifest.record(part_path)
+        else:
+            os.replace(file["path"], file["path"] + CORRUPT_SUFFIX)
+        self.manifest.record(file["path"])
+
+    def drop_blob(self, file):
+        """Forget the stored blob for a bad file, deleting it if the file is a link to it."""
+        if not self.blob_store:
+            return
+        digest = self.blob_store.forget(canonical_key(file["url"]))
+        blob = self.blob_store.blob_path(digest) if digest else None
+        if blob and os.path.exists(blob) and os.path.samefile(blob, file["path"]):
+            os.remove(blob)
+
+    def expected_digest(self, file, size, mtime):
+        if self.blob_store:
+            digest = self.blob_store.keys.get(canonical_key(file["url"]))
+            if digest:
+                return digest
+        # An earlier digest only still applies if the file wasn't rewritten since
+        if file.get("verified_size") == size and file.get("verified_mtime") == mtime:
+            return file.get("sha256")
+        return None
+
+    def check_sizes(self):
+        """Fail missing and wrongly sized files and return (file, size, mtime) for the ones to hash."""
+        to_hash = []
+        for file in iter_files(self.data):
+            entry = self.manifest.stat(file["path"])
+            if entry is None:
+                if file["downloaded"]:
+                    self.fail(file, "missing")
+                continue
+            size, mtime = entry
+            # Only sizes from the Files API or a completed download are exact; a
+            # HEAD's content-length may not be, so those files are hashed instead
+            expected = file.get("size", 0) if file.get("size_exact") else 0
+            if expected and size != expected:
+                self.fail(file, "truncated" if size < expected else "size")
+                continue
+            if not self.full and file.get("sha256") and file.get("verified_size") == size and file.get("verified_mtime") == mtime:
+                self.count("unchanged")
+                continue
+            to_hash.append((file, size, mtime))
+        return to_hash
+
+    def hash_files(self, to_hash):
+        from tqdm import tqdm
+        total = sum(size for _, size, _ in to_hash)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool, \
+                tqdm(total=total, unit="B", unit_scale=True, desc="Verifying") as bar:
+            futures = {pool.submit(digest_file, self.manifest.abspath(file["path"])): (file, size, mtime)
+                       for file, size, mtime in to_hash}
+            for future in as_completed(futures):
+                file, size, mtime = futures[future]
+                bar.update(size)
+                try:
+                    digest, hashed_size, hashed_mtime = future.result()
+                except OSError as e:
+                    logger.info(f"Could not read {file['path']}: {e}")
+                    self.count("error")
+                    continue
+                self.hashed_bytes += hashed_size
+                expected = self.expected_digest(file, size, mtime)
+                if expected and digest != expected:
+                    self.fail(file, "digest")
+                    continue
+                self.count("ok")
+                file.update(sha256=digest, verified_size=hashed_size, verified_mtime=hashed_mtime)
+                if not file["downloaded"]:
+                    file["downloaded"] = True
+                    self.data["download_log"][self.manifest.abspath(file["path"])] = True
+
+    def run(self):
+        self.download_log = load_download_log()
+        try:
+            with get_metrics().timer("verify"):
+                self.hash_files(self.check_sizes())
+        finally:
+            self.download_log.close()
+        if self.blob_store and any(reason != "missing" for _, reason in self.failed):
+            self.blob_store.save()
+        return self.results
+
+def verify_archive(config, full=False):
+    """Verify every indexed file, update the index and print a summary. Returns the failed (file, reason) pairs."""
+    data = load_index_file()
+    if not data:
+        print("No index found. Run the downloader first.")
+        return []
+    data.setdefault("download_log", {})
+    verifier = ArchiveVerifier(config, data, full)
+    start = time.perf_counter()
+    results = verifier.run()
+    elapsed = time.perf_counter() - start
+    save_index_file(update_totals(data))
+
+    mb = verifier.hashed_bytes / 1024 / 1024
+    print(f"\nVerified {sum(results.values())} files in {elapsed:.1f}s: hashed {results['ok'] + results['digest']} "
+          f"({mb:.2f} MB, {mb / elapsed if elapsed else 0:.2f} MB/s), {results['unchanged']} unchanged since the last check.")
+    if verifier.failed:
+        print(f"{len(verifier.failed)} files failed and will be downloaded again: {results['missing']} missing, "
+              f"{results['truncated']} truncated, {results['size'] + results['digest']} with wrong content "
+              f"(kept as *{CORRUPT_SUFFIX}).")
+        for file, reason in verifier.failed[:20]:
+            print(f"  {reason:<9} {file['path']}")
+    if results["error"]:
+        print(f"{results['error']} files could not be read; see the log.")
+    return verifier.failed
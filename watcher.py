@@ -0,0 +1,251 @@
+# watcher.py
+import os
+import json
+import time
+import heapq
+import random
+import signal
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import reload_config
+from download_log import load_download_log
+from download_manager import DownloadManager
+from download_scheduler import DownloadQueue
+from http_cache import ResponseCache
+from negative_cache import get_negative_cache
+from page_export import get_page_exporter
+from indexer import (fetch_courses, index_course, load_index_file, save_index_file, save_course_index,
+                     check_downloaded_files, mark_file_downloaded, iter_files, update_totals)
+
+logger = logging.getLogger(__name__)
+
+class CourseWatcher:
+    """Keep one session, the index and a download pool warm and poll courses on their own schedules.
+
+    Each course's modules page is re-fetched every `interval` seconds (with
+    +/- WATCH_JITTER spread). A poll that finds changes halves the course's
+    interval down to WATCH_MIN_INTERVAL; an unchanged poll stretches it by
+    half up to WATCH_MAX_INTERVAL, so active courses are checked more often.
+    New files go straight to a DownloadManager fed from a DownloadQueue, so
+    DOWNLOAD_ORDER applies to them. Progress is
+    written to WATCH_STATUS_FILE after every poll.
+    """
+
+    def __init__(self, session, config):
+        self.session = session
+        self.config = config
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.jobs = DownloadQueue.from_config(config)
+        self.queued = set()
+        self.schedule = []
+        self.courses = {}
+        self.state = {}
+        self.started = time.time()
+        self.courses_refreshed = 0.0
+        self.dirty = False
+        self.changed = set()
+        self.full_save = False
+        self.data = None
+        self.cache = None
+        self.manager = None
+        self.executor = None
+
+    def interval_bounds(self):
+        base = float(self.config.get("WATCH_INTERVAL", 1800))
+        low = float(self.config.get("WATCH_MIN_INTERVAL", 300))
+        high = float(self.config.get("WATCH_MAX_INTERVAL", 21600))
+        return base, low, max(low, high)
+
+    def jittered(self, interval):
+        jitter = float(self.config.get("WATCH_JITTER", 0.2))
+        return interval * random.uniform(1 - jitter, 1 + jitter)
+
+    def enqueue(self, file):
+        with self.lock:
+            if file["downloaded"] or file["path"] in self.queued:
+                return
+            self.queued.add(file["path"])
+        self.jobs.put(file)
+
+    def downloaded(self, file):
+        persisted = mark_file_downloaded(file)
+        with self.lock:
+            self.queued.discard(file["path"])
+            if not persisted:
+                # The JSON index only records downloads when the whole file is saved
+                self.dirty = self.full_save = True
+
+    def download_failed(self, file, error=None):
+        # Let the next poll of its course queue it again
+        with self.lock:
+            self.queued.discard(file["path"])
+
+    def stop(self, *args):
+        if self.stop_event.is_set():
+            # Second Ctrl+C: stop waiting for the current poll
+            raise KeyboardInterrupt
+        self.stop_event.set()
+
+    def refresh_courses(self):
+        """Fetch the course list, scheduling new courses now and dropping ones that disappeared."""
+        try:
+            courses = fetch_courses(self.session, self.config)
+        except Exception as e:
+            logger.info(f"Failed to fetch course list, keeping the current courses: {e}")
+            return
+        self.courses_refreshed = time.time()
+        current = {str(c["id"]): c for c in courses}
+        base, _, _ = self.interval_bounds()
+        for course_id, course in current.items():
+            if course_id not in self.state:
+                self.state[course_id] = {"name": course["name"], "interval": base, "next_poll": time.time(),
+                                         "last_poll": None, "last_change": None, "polls": 0, "changes": 0}
+                heapq.heappush(self.schedule, (time.time(), course_id))
+            self.state[course_id]["name"] = course["name"]
+        for course_id in set(self.courses) - set(current):
+            logger.info(f"Course {self.courses[course_id]['name']} is no longer listed, dropping it from the index")
+        with self.lock:
+            kept = [c for c in self.data["courses"] if str(c["id"]) in current]
+            if len(kept) != len(self.data["courses"]):
+                self.data["courses"] = kept
+                self.dirty = self.full_save = True
+        self.courses = current
+
+    def poll(self, course_id):
+        course = self.courses[course_id]
+        state = self.state[course_id]
+        previous = next((c for c in self.data["courses"] if str(c["id"]) == course_id), None)
+        course_data = index_course(self.session, self.executor, self.config, course, self.cache, previous, self.enqueue)
+
+        _, low, high = self.interval_bounds()
+        state["last_poll"] = time.time()
+        state["polls"] += 1
+        if course_data is not None and course_data is not previous:
+            state["last_change"] = state["last_poll"]
+            state["changes"] += 1
+            state["interval"] = max(low, state["interval"] / 2)
+            with self.lock:
+                if previous is None:
+                    self.data["courses"].append(course_data)
+                else:
+                    self.data["courses"][self.data["courses"].index(previous)] = course_data
+                self.changed.add(course_id)
+                self.dirty = True
+            logger.info(f"Changes in {course['name']}, next check in about {state['interval']:.0f}s")
+        else:
+            state["interval"] = min(high, state["interval"] * 1.5)
+        state["next_poll"] = time.time() + self.jittered(state["interval"])
+        heapq.heappush(self.schedule, (state["next_poll"], course_id))
+
+    def save(self, force=False):
+        """Persist what changed: only the re-indexed courses, unless the index needs a full save (or `force`)."""
+        with self.lock:
+            if not (self.dirty or force):
+                return
+            changed, self.changed = self.changed, set()
+            full, self.full_save = self.full_save or force, False
+            self.dirty = False
+            update_totals(self.data)
+            if full:
+                save_index_file(self.data)
+            else:
+                for course_id in changed:
+                    save_course_index(self.data, course_id)
+        if self.cache:
+            self.cache.save()
+        negative = get_negative_cache(self.config)
+        if negative:
+            negative.save()
+        pages = get_page_exporter(self.config)
+        if pages:
+            pages.flush()
+
+    def write_status(self, state="running"):
+        path = self.config.get("WATCH_STATUS_FILE", "data/watch_status.json")
+        if not path:
+            return
+        status = {
+            "state": state,
+            "pid": os.getpid(),
+            "started": self.started,
+            "updated": time.time(),
+            "queued_downloads": len(self.jobs),
+            "downloads": {k: v for k, v in self.manager.summary().items() if k in ("completed", "failed", "skipped", "bytes")},
+            "total_files": self.data.get("total_files", 0),
+            "courses": [dict(s, id=course_id) for course_id, s in sorted(self.state.items(), key=lambda kv: kv[1]["next_poll"])],
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(status, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def run(self):
+        """Poll until SIGINT/SIGTERM, then let running transfers finish and flush everything to disk."""
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.stop)
+
+        self.data = load_index_file() or {"courses": [], "download_log": {}}
+        if self.data["courses"]:
+            check_downloaded_files(self.data)
+        update_totals(self.data)
+        download_log = load_download_log()
+        download_log.merge(self.data.get("download_log", {}))
+        self.data["download_log"] = download_log
+
+        self.cache = ResponseCache.from_config(self.config)
+        self.manager = DownloadManager(self.session, self.config, download_log,
+                                       on_complete=self.downloaded, on_failed=self.download_failed,
+                                       on_skipped=self.download_failed)
+        consumer = threading.Thread(target=self.manager.run, args=(self.jobs,))
+        consumer.start()
+        for file in iter_files(self.data):
+            self.enqueue(file)
+
+        workers = max(1, int(self.config.get("INDEX_WORKERS", 1)))
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        print("Watching courses for new files. Press Ctrl+C to stop.")
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.config = reload_config()
+                except (OSError, ValueError) as e:
+                    # Malformed mid-edit, or briefly missing during an editor's atomic save
+                    logger.info(f"Ignoring config change, keeping the previous settings: {e}")
+                refresh = float(self.config.get("WATCH_COURSE_LIST_INTERVAL", 21600))
+                if time.time() - self.courses_refreshed >= refresh:
+                    self.refresh_courses()
+
+                while self.schedule and self.schedule[0][1] not in self.courses:
+                    heapq.heappop(self.schedule)
+                if self.schedule and self.schedule[0][0] <= time.time():
+                    _, course_id = heapq.heappop(self.schedule)
+                    try:
+                        self.poll(course_id)
+                    except Exception as e:
+                        logger.info(f"Polling {self.courses[course_id]['name']} failed: {e}")
+                        heapq.heappush(self.schedule, (time.time() + self.jittered(self.state[course_id]["interval"]), course_id))
+                    self.save()
+                    self.write_status()
+                    continue
+
+                self.save()
+                self.write_status()
+                next_due = self.schedule[0][0] if self.schedule else time.time() + refresh
+                self.stop_event.wait(max(0.0, min(next_due, self.courses_refreshed + refresh) - time.time()))
+        finally:
+            print("\nStopping: finishing running downloads and saving the index...")
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            # Queued files stay marked as not downloaded and are picked up next time
+            self.jobs.clear()
+            self.jobs.close()
+            consumer.join()
+            download_log.close()
+            self.save(force=True)
+            pages = get_page_exporter(self.config)
+            if pages:
+                pages.close()
+            self.write_status("stopped")
+            self.manager.print_summary()